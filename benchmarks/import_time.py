@@ -0,0 +1,47 @@
+# Measures how long `import crn` takes in a fresh interpreter, and checks
+# that it does not pull in the modules that are only needed by some calls.
+#
+#     python benchmarks/import_time.py [repeat] [budget in seconds]
+#
+# Exits with status 1 if a lazy module is imported eagerly or the fastest
+# import takes longer than the budget (default: 1 second).
+
+import subprocess
+import sys
+
+# modules that `import crn` must not import
+LAZY = ("matplotlib", "sympy", "stochpy", "lib2to3", "scipy.integrate")
+
+SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+import crn
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(" ".join(m for m in {LAZY!r} if m in sys.modules))
+"""
+
+def import_time():
+    """
+    Returns the seconds `import crn` took in a new interpreter, and the
+    lazy modules it imported.
+    """
+    out = subprocess.run([sys.executable, "-c", SCRIPT], check=True,
+                         capture_output=True, text=True).stdout.split("\n")
+    return float(out[0]), out[1].split()
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    runs = [import_time() for _ in range(repeat)]
+    times = sorted(elapsed for elapsed, _ in runs)
+    eager = sorted(set(m for _, imported in runs for m in imported))
+
+    print(f"import crn ({repeat} runs)")
+    print(f"    best   {times[0] * 1e3:10.2f} ms")
+    print(f"    median {times[len(times) // 2] * 1e3:10.2f} ms")
+    print(f"    eagerly imported: {', '.join(eager) or 'none'}")
+
+    if eager or times[0] > budget:
+        sys.exit(1)
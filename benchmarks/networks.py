@@ -0,0 +1,86 @@
+# Generators of synthetic CRNs for the benchmarks, parameterized by their
+# number of reactions so the same shapes can be timed from 10 to 100k
+# reactions. Every generator returns the reactions, ready to be passed to
+# `CRN`, and initial amounts for them, and is deterministic given `seed`.
+
+import numpy as np
+
+from crn import Species, schemas
+
+def chain(n, seed=0):
+    """
+    X0 -> X1 -> ... -> Xn, every step with rate constant 1. Every species
+    but Xn starts with 1000 molecules, so even the shortest chain has tens
+    of thousands of events to fire before everything ends up in Xn.
+    """
+    xs = [Species(f"X{i}") for i in range(n + 1)]
+    rxns = [(x >> y).k(1.0) for x, y in zip(xs, xs[1:])]
+    return rxns, {x: 1000 for x in xs[:-1]}
+
+def random_bimolecular(n, seed=0):
+    """
+    `n` reactions A + B -> C + D between n // 2 species, picked uniformly
+    at random, with rate constants spread over two orders of magnitude.
+    The products of every reaction are the reactants of another, so every
+    species is made by as many reactions as use it up, and every species
+    starts with 1000 molecules, so the network doesn't run dry.
+    """
+    rng = np.random.default_rng(seed)
+    xs = [Species(f"R{i}") for i in range(max(2, n // 2))]
+    reactants = rng.integers(len(xs), size=(n, 2))
+    products = reactants[rng.permutation(n)]
+    rates = (10 ** rng.uniform(-1, 1, size=n)).tolist()
+    rxns = [(xs[a] + xs[b] >> xs[c] + xs[d]).k(k)
+            for (a, b), (c, d), k in zip(reactants.tolist(),
+                                         products.tolist(), rates)]
+    return rxns, {x: 1000 for x in xs}
+
+def stiff_cascade(n, seed=0):
+    """
+    A reversible chain of about n / 3 species whose rate constants
+    alternate between 1e3 and 1e-3, with a slow annihilation between every
+    pair of neighbours, like benchmarks/stiff.py. The species the fast
+    reactions flow into start with 1000 molecules, so the network doesn't
+    empty out in its first few events.
+    """
+    xs = [Species(f"S{i}") for i in range(max(2, n // 3 + 1))]
+    rxns = []
+    for i, (x, y) in enumerate(zip(xs, xs[1:])):
+        fast, slow = (1e3, 1e-3) if i % 2 else (1e-3, 1e3)
+        rxns.append((x >> y).k(fast))
+        rxns.append((y >> x).k(slow))
+        rxns.append((x + y >> 0).k(1e-3))
+    return rxns[:n], {x: 1000 for x in xs[::2]}
+
+def schema_stack(n, seed=0):
+    """
+    A ring of about n / 4 binary stacks, as in
+    crn/examples/schema_example.py: a single token pops the top bit of its
+    stack and pushes it onto the next one, forever. Every reaction is a
+    schema, so the number of instantiated reactions stays small.
+    """
+    groups = {"rest": "[01]*", "top": "[01]"}
+    m = max(1, n // 4)
+    stacks = [schemas(f"Stack{i}<{{rest}}{{top}}>", groups)
+              for i in range(m)]
+    pop = [Species(f"pop{i}") for i in range(m)]
+    push = [(Species(f"push{i}_0"), Species(f"push{i}_1")) for i in range(m)]
+
+    rxns = []
+    for i in range(m):
+        here, there = stacks[i], stacks[(i + 1) % m]
+        for bit in (0, 1):
+            rxns.append(pop[i] + here("r", bit) >> push[i][bit] + here("r"))
+            rxns.append(push[i][bit] + there("q")
+                        >> pop[(i + 1) % m] + there("q", bit))
+
+    amounts = {pop[0]: 1, stacks[0](int("10" * 8)): 1}
+    amounts.update({stack(): 1 for stack in stacks[1:m]})
+    return rxns[:n], amounts
+
+GENERATORS = {
+    "chain": chain,
+    "random_bimolecular": random_bimolecular,
+    "stiff_cascade": stiff_cascade,
+    "schema_stack": schema_stack,
+}
@@ -0,0 +1,69 @@
+# Compares the ODE solvers available to CRN.simulate on stiff networks.
+#
+# The "odeint" row integrates the NumPy right-hand side of the CRN with LSODA
+# through `scipy.integrate.odeint` and a finite-difference Jacobian, as
+# CRN.simulate used to. It is not the original code path, whose right-hand
+# side evaluated a compiled string of rate laws, so it only shows what the
+# analytic Jacobian and the choice of solver gain. The other rows go through
+# CRN.simulate with the analytic Jacobian.
+#
+#     python benchmarks/stiff.py
+
+import numpy as np
+import time
+
+from crn import *
+from scipy.integrate import odeint
+
+def robertson():
+    """
+    Robertson's chemical kinetics problem, the classic stiff test case.
+    """
+    a, b, c = species("A B C")
+    sys = CRN(
+        (a >> b).k(0.04),
+        (2 * b >> b + c).k(3e7),
+        (b + c >> a + c).k(1e4),
+        name="robertson")
+    return sys, {a: 1.0}, 1e4
+
+def cascade(n):
+    """
+    A reversible chain of `n` species whose rate constants alternate
+    between 1e3 and 1e-3.
+    """
+    xs = list(species(" ".join(f"X{i}" for i in range(n))))
+    rxns = []
+    for i, (x, y) in enumerate(zip(xs, xs[1:])):
+        fast, slow = (1e3, 1e-3) if i % 2 else (1e-3, 1e3)
+        rxns.append((x >> y).k(fast))
+        rxns.append((y >> x).k(slow))
+        rxns.append((x + y >> 0).k(1.0))
+    return CRN(*rxns, name=f"cascade{n}"), {xs[0]: 1.0, xs[-1]: 1.0}, 100
+
+def best_of(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(name, sys, conc, t):
+    v0 = [conc.get(sp, 0) for _, sp in sorted(sys.species_index.items())]
+    timings = {
+        "odeint": lambda: odeint(sys.diffeq_system_func, v0,
+                                  np.linspace(0, t, 100)),
+        "LSODA": lambda: sys.simulate(conc, t=t, method="LSODA"),
+        "BDF": lambda: sys.simulate(conc, t=t, method="BDF"),
+        "Radau": lambda: sys.simulate(conc, t=t, method="Radau"),
+    }
+
+    print(f"{name} ({len(sys.species)} species, {len(sys.system)} reactions)")
+    for method, func in timings.items():
+        print(f"    {method:<8} {best_of(func) * 1e3:10.2f} ms")
+
+if __name__ == "__main__":
+    run("robertson", *robertson())
+    for n in (10, 100, 500):
+        run(f"cascade({n})", *cascade(n))
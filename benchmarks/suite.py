@@ -0,0 +1,236 @@
+# Times the main entry points of CRN on the synthetic networks of
+# benchmarks/networks.py, from 10 up to 100k reactions, records the peak
+# memory allocated by every run with tracemalloc, writes the results as JSON
+# and compares them against a stored baseline.
+#
+#     python benchmarks/suite.py [--max-size N] [--only NAME ...]
+#                                [--output FILE] [--baseline FILE]
+#                                [--save-baseline] [--tolerance T]
+#                                [--repeat R] [--retries N]
+#
+# The names given to --only select benchmarks ("simulate") or networks
+# ("chain"). Timings depend on the machine, so the baseline is only
+# meaningful on the machine it was saved on: run with --save-baseline
+# there first. Exits with status 1 if a run got slower or allocated more
+# than its baseline by more than the tolerance (default: 0.5, that is 50%).
+# Timings on a busy machine drift by that much from one minute to the
+# next, so the runs that got worse are measured again, up to --retries
+# times, and only the ones that stay worse are reported.
+
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import random
+import scipy
+import sys
+import time
+import tracemalloc
+
+from crn import CRN, Species
+from networks import GENERATORS
+
+SIZES = (10, 100, 1000, 10000, 100000)
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "baseline.json")
+
+# how many events a stochastic run is aimed at, whatever the network
+EVENTS = 10000
+# differences below these are noise, not regressions
+MIN_SECONDS = 2e-2
+MIN_BYTES = 1 << 16
+
+def construct(reactions, amounts):
+    return lambda: CRN(*reactions)
+
+def simulate(reactions, amounts):
+    crn = CRN(*reactions)
+    return lambda: crn.simulate(amounts, t=10, method="BDF")
+
+def stoch_simulate(reactions, amounts):
+    crn = CRN(*reactions)
+    # run for about EVENTS events at the initial propensities, so the runs
+    # take comparable work on networks of every size
+    counts = crn.initial_vector(amounts, dtype=np.int64)
+    t = EVENTS / crn.stoichiometry.propensities(counts).sum()
+
+    def run():
+        sim = crn.stoch_simulate(amounts, t=t, seed=0,
+                                 method="next_reaction")
+        # a network that runs out of events early would time nothing
+        if len(sim.time) < EVENTS // 2:
+            raise RuntimeError(f"only {len(sim.time)} events fired on a "
+                               f"network of {len(reactions)} reactions.")
+    return run
+
+def schema_simulate(reactions, amounts):
+    crn = CRN(*reactions)
+    return lambda: crn.schema_simulate(amounts, steps=1000, seed=0)
+
+def validate(reactions, amounts):
+    # everything in X0 ends up in the last species of a chain
+    crn = CRN(*reactions)
+    first, last = Species("X0"), Species(f"X{len(reactions)}")
+
+    def run():
+        random.seed(0)
+        result = crn.validate(lambda conc: conc[first], input_species=[first],
+                              output_species=last, N=10,
+                              t=2 * len(reactions) + 100, steady_state=1e-9)
+        if not result["success"]:
+            raise RuntimeError(f"validate failed on a chain of "
+                               f"{len(reactions)} reactions.")
+    return run
+
+# (benchmark, network, largest number of reactions)
+CASES = [
+    (construct, "chain", 100000),
+    (construct, "random_bimolecular", 100000),
+    (construct, "stiff_cascade", 100000),
+    (construct, "schema_stack", 10000),
+    (simulate, "chain", 10000),
+    (simulate, "random_bimolecular", 1000),
+    (simulate, "stiff_cascade", 10000),
+    (stoch_simulate, "chain", 100000),
+    (stoch_simulate, "random_bimolecular", 100000),
+    (stoch_simulate, "stiff_cascade", 100000),
+    (schema_simulate, "schema_stack", 1000),
+    (validate, "chain", 1000),
+]
+
+def measure(func, repeat, budget=2.0):
+    """
+    Returns the fastest of up to `repeat` runs of `func`, stopping early
+    once they took `budget` seconds, and the peak bytes allocated by one
+    more run under tracemalloc.
+    """
+    best, total = float("inf"), 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best, total = min(best, elapsed), total + elapsed
+        if total > budget:
+            break
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def run(max_size, only, repeat, keys=None):
+    """
+    Runs the benchmarks selected by `max_size` and `only`, or only the ones
+    in `keys` if given, and returns their results by key.
+    """
+    results = {}
+    for benchmark, network, largest in CASES:
+        if only and benchmark.__name__ not in only and network not in only:
+            continue
+        for n in SIZES:
+            if n > min(largest, max_size):
+                break
+            key = f"{benchmark.__name__}/{network}/{n}"
+            if keys is not None and key not in keys:
+                continue
+            reactions, amounts = GENERATORS[network](n)
+            seconds, peak = measure(benchmark(reactions, amounts), repeat)
+            results[key] = {"seconds": seconds, "peak_bytes": peak,
+                            "reactions": len(reactions)}
+            print(f"{key:<40} {seconds * 1e3:12.2f} ms "
+                  f"{peak / (1 << 20):10.2f} MiB", flush=True)
+    return results
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%d"),
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Prints every result next to its baseline and returns the keys of the
+    ones that got worse by more than `tolerance`.
+    """
+    worse = []
+    print(f"\n{'':<40} {'time':>10} {'memory':>10}   vs. baseline")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        time_ratio = (max(result["seconds"], MIN_SECONDS)
+                      / max(base["seconds"], MIN_SECONDS))
+        memory_ratio = (max(result["peak_bytes"], MIN_BYTES)
+                        / max(base["peak_bytes"], MIN_BYTES))
+        flag = ""
+        if max(time_ratio, memory_ratio) > 1 + tolerance:
+            worse.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<40} {time_ratio:9.2f}x {memory_ratio:9.2f}x{flag}")
+    return worse
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark CRN on synthetic networks.")
+    parser.add_argument("--max-size", type=int, default=max(SIZES),
+                        help="the most reactions in a network")
+    parser.add_argument("--only", nargs="*", default=(),
+                        help="benchmarks or networks to run")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="the most runs to take the fastest of")
+    parser.add_argument("--output", help="where to write the results")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="the results to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="the largest relative slowdown allowed")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="how many times to measure again the runs "
+                             "that got worse")
+    args = parser.parse_args()
+
+    results = run(args.max_size, set(args.only), args.repeat)
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    worse = compare(results, baseline, args.tolerance) if baseline else []
+    for _ in range(args.retries):
+        if not worse:
+            break
+        print(f"\nmeasuring {len(worse)} runs again", flush=True)
+        again = run(args.max_size, set(args.only), args.repeat, set(worse))
+        for key, result in again.items():
+            # keep the best of every measurement
+            results[key]["seconds"] = min(results[key]["seconds"],
+                                          result["seconds"])
+            results[key]["peak_bytes"] = min(results[key]["peak_bytes"],
+                                             result["peak_bytes"])
+        worse = compare({key: results[key] for key in worse}, baseline,
+                        args.tolerance)
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        # keep the baseline of the benchmarks that were not run
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                report["results"] = {**json.load(f)["results"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif worse:
+        sys.exit(1)
@@ -3,6 +3,5 @@ __all__ = ["species", "CRN", "schemas"]
 from crn.reaction import *
 from crn.simulation import *
 import crn.utils as utils
-utils.stochpy_fix()
 from crn.crn import *
 
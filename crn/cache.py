@@ -0,0 +1,181 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from collections import OrderedDict
+
+# bump when the layout of an entry or of Stoichiometry changes
+FORMAT = 3
+
+def species_identity(sp):
+    """
+    Returns a string that tells `sp` apart from every species not equal to
+    it: its name, plus its groups if it is a schema.
+    """
+    if not sp.is_schema:
+        return sp.name
+    groups = ",".join(f"{k}={v}" for k, v in sorted(sp.schema_groups.items()))
+    return f"{sp.name}{{schema:{groups}}}"
+
+class CompileCache:
+    """
+    Cache of compiled networks, keyed by a content hash of their reactions.
+    The rate constants are left out of the key, since the compiled network
+    does not depend on them: a hit gives back the species order and the
+    `Stoichiometry` of the network, and `CRN.__init__` gives it the rate
+    constants of its own reactions with `Stoichiometry.with_rates`.
+
+    The `max_entries` most recently used entries are kept in memory, and,
+    with `directory`, every entry is also kept on disk as one pickle per
+    network, so identical networks built in other processes or sessions hit
+    too. Once the files on disk take up more than `max_size` bytes, the
+    least recently used ones are deleted.
+
+    args:
+        directory: Optional[str]
+            Where to store the compiled networks. Created if it does not
+            exist. No disk store if None.
+        max_size: int
+            The most bytes the disk store may take up.
+        max_entries: int
+            The most networks kept in memory.
+    """
+    def __init__(self, directory=None, max_size=1 << 28, max_entries=32):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, reactions):
+        """
+        Returns the content hash of `reactions`: their order, reactants and
+        products, with the species told apart by `species_identity`.
+        """
+        h = hashlib.sha256(f"crn-compile-{FORMAT}\n".encode())
+        for rxn in reactions:
+            reactants = " ".join(f"{c}*{species_identity(sp)}"
+                                 for sp, c in rxn.reactants.species.items())
+            products = " ".join(f"{c}*{species_identity(sp)}"
+                                for sp, c in rxn.products.species.items())
+            h.update(f"{reactants}>{products}\n".encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the (species identities, Stoichiometry) stored under `key`,
+        or None.
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        if self.directory is None:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, species, stoichiometry):
+        """
+        Stores the compiled network `stoichiometry`, whose columns are the
+        species with the identities `species`, under `key`.
+        """
+        entry = (list(species), stoichiometry)
+        self._remember(key, entry)
+
+        if self.directory is None:
+            return
+
+        # write to a temporary file first so other processes never read a
+        # partially written entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries on disk until the store
+        takes up at most `max_size` bytes.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            self.memory.pop(name[:-len(".pkl")], None)
+            size -= entry_size
+
+    def clear(self):
+        """
+        Empties the cache, in memory and on disk.
+        """
+        self.memory.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+
+_default_cache = None
+
+def default_cache():
+    """
+    Returns the cache used by `CRN(..., cache=True)`, stored in the
+    directory named by the CRN_CACHE_DIR environment variable, or in
+    ~/.cache/crn.
+    """
+    global _default_cache
+    if _default_cache is None:
+        directory = os.environ.get("CRN_CACHE_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "crn")
+        _default_cache = CompileCache(directory)
+    return _default_cache
+
+def get_cache(cache):
+    """
+    Resolves the `cache` argument of `CRN`: None or False for no cache,
+    True for `default_cache()`, a directory name, or a `CompileCache`.
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return default_cache()
+    if isinstance(cache, CompileCache):
+        return cache
+    return CompileCache(cache)
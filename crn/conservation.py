@@ -0,0 +1,85 @@
+import numpy as np
+
+from scipy import sparse
+
+class ReducedSystem:
+    """
+    The mass-action ODEs of a `Stoichiometry` with the species that are
+    determined by its conservation laws left out. Only the independent
+    species of `Stoichiometry.conservation` are integrated, and the others
+    are reconstructed from them with the link matrix, which makes for a
+    smaller system whose Jacobian is no longer singular.
+
+    A law that spans much of the network, such as the total mass of a
+    closed one, puts as many terms into the Jacobian rows of every rate law
+    its species appears in, and the fill that causes in a sparse LU
+    factorization can cost more than the species saved. `max_terms` leaves
+    such laws in the system.
+
+    This class has the `rhs`, `jacobian` and `inert` that
+    `crn.integrate.integrate` uses, so the reduced system integrates like
+    a plain network.
+
+    args:
+        stoichiometry: Stoichiometry
+            The compiled CRN.
+        x0: np.ndarray
+            The initial concentration of every species, which sets the
+            conserved totals.
+        max_terms: Optional[int]
+            Only leave out the species whose law involves at most this many
+            independent species. No limit if None.
+    """
+    def __init__(self, stoichiometry, x0, max_terms=None):
+        independent, link = stoichiometry.conservation()
+        # the inert species are in no law, but a plain network still
+        # integrates their net change, so integrate them as well
+        independent, link = self._keep(independent, link, stoichiometry.inert)
+        if max_terms is not None:
+            terms = np.diff(link.indptr)
+            independent, link = self._keep(independent, link,
+                                           np.flatnonzero(terms > max_terms))
+
+        self.stoichiometry = stoichiometry
+        self.independent, self.link = independent, link
+        self.x0 = np.asarray(x0, dtype=float)
+        self.y0 = self.x0[self.independent]
+        self.inert = np.flatnonzero(np.isin(self.independent,
+                                            stoichiometry.inert))
+        self._net = stoichiometry.net[self.independent]
+
+    @staticmethod
+    def _keep(independent, link, kept):
+        # integrate the dependent species `kept` as well; they become
+        # independent, with a column of their own in the link
+        kept = np.setdiff1d(kept, independent)
+        if not len(kept):
+            return independent, link
+
+        n, m = link.shape
+        extra = sparse.csr_matrix(
+            (np.ones(len(kept)), (kept, np.arange(len(kept)))),
+            shape=(n, len(kept)))
+        rows = np.ones(n, dtype=bool)
+        rows[kept] = False
+        link = sparse.hstack([sparse.diags(rows.astype(float)) @ link,
+                              extra], format="csr")
+
+        independent = np.concatenate([independent, kept])
+        order = np.argsort(independent)
+        return independent[order], link[:, order]
+
+    def full(self, y):
+        """
+        Returns the concentrations of every species given those of the
+        independent ones, `y`, or a (time x species) array given a (time x
+        independent) array.
+        """
+        return self.x0 + (self.link @ (y - self.y0).T).T
+
+    def rhs(self, y, t=None):
+        return self._net @ self.stoichiometry.fluxes(self.full(y))
+
+    def jacobian(self, y, t=None):
+        jacobian = self.stoichiometry.jacobian(self.full(y))
+        return (jacobian[self.independent] @ self.link).tocsr()
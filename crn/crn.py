@@ -1,13 +1,30 @@
 import numpy as np
-
-from crn import Species, Simulation, utils
-from numpy import log
-from numpy.random import choice
-from random import random, uniform
-from scipy.integrate import odeint
-
-with utils.no_output():
-    import stochpy
+import os
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import product
+from crn import Expression, Reaction, Species, Simulation, utils
+from crn.cache import get_cache, species_identity
+from crn.conservation import ReducedSystem
+from crn.ensemble import run_ensemble
+from crn.instrument import Stats, phase
+from crn.integrate import final_states, integrate, integrate_chunk
+from crn.parse import parse_reactions
+from crn.recording import TrajectoryBuffer
+from crn.schema import schema_simulation
+from crn.sensitivity import Sensitivities
+from crn.stochastic import direct_method, next_reaction_method, tau_leaping
+from crn.stoichiometry import Stoichiometry
+from crn.storage import TrajectoryWriter
+from random import random
+from scipy import sparse
+
+STOCHASTIC_METHODS = {
+    "direct": direct_method,
+    "next_reaction": next_reaction_method,
+    "tau_leaping": tau_leaping,
+}
 
 class CRN:
     """ A Chemical Reaction Network (CRN)
@@ -24,23 +41,151 @@ class CRN:
             name: str
                 defaults to `id(self)`. Used for naming any files produced
                 by the CRN during simulation.
+            cache: Union[None, bool, str, CompileCache]
+                Look the compiled network up in a `crn.cache.CompileCache`,
+                and store it there on a miss, so that building the same
+                reactions again, in this process or another one and with
+                any rate constants, skips compiling them. True uses
+                `crn.cache.default_cache()`, a str is a directory to keep
+                the cache in. Defaults to no cache.
     """
 
     def __init__(self, *system, **kwargs):
         self.system = system
         self.species = self.get_species()
-        self.species_index = self.get_species_index()
         self.reactions_index = self.get_reactions_index()
-        self.diffeq_system_func = self.rate_laws()
+
+        cache = get_cache(kwargs.get("cache"))
+        compiled = None
+        if cache is not None:
+            key = cache.key(system)
+            compiled = cache.get(key)
+
+        if compiled is not None:
+            # the cache is keyed without the rate constants
+            identities, stoichiometry = compiled
+            self.stoichiometry = stoichiometry.with_rates(self.rates)
+            by_identity = {species_identity(sp): sp for sp in self.species}
+            self.species_index = {i: by_identity[name]
+                                  for i, name in enumerate(identities)}
+        else:
+            self.species_index = self.get_species_index()
+            self.stoichiometry = self.get_stoichiometry()
+            if cache is not None:
+                cache.put(key, [species_identity(sp)
+                                for sp in self.species_index.values()],
+                          self.stoichiometry)
+
         self.name = kwargs.get("name", id(self))
 
+    @classmethod
+    def from_arrays(cls, species, reactants, products, rates=None,
+                    name=None):
+        """
+        Builds a CRN straight from its stoichiometry, compiling it without
+        going through per-term Species arithmetic. Reactions with no
+        reactants or no products get "nothing" on that side, like `0 >> a`.
+
+        args:
+            species: Sequence[Union[Species, str]]
+                The species, or their names, in column order.
+            reactants: Union[np.ndarray, scipy.sparse.spmatrix]
+                (reactions x species) matrix of reactant coefficients.
+            products: Union[np.ndarray, scipy.sparse.spmatrix]
+                (reactions x species) matrix of product coefficients.
+            rates: Optional[Sequence[float]]
+                The rate constant of every reaction. Defaults to 1.
+            name: Optional[str]
+                As in the constructor.
+        """
+        # every object built here is acyclic, so nothing for gc to find
+        with utils.gc_paused():
+            species = [sp if type(sp) is Species else Species(sp)
+                       for sp in species]
+            reactants = sparse.csr_matrix(reactants, dtype=np.int64, copy=True)
+            products = sparse.csr_matrix(products, dtype=np.int64, copy=True)
+            for m in (reactants, products):
+                m.sum_duplicates()
+                m.eliminate_zeros()
+            if reactants.shape[1] != len(species):
+                raise ValueError(
+                    f"CRN.from_arrays: got {len(species)} species for "
+                    f"{reactants.shape[1]} columns of stoichiometry.")
+            if rates is None:
+                rates = np.ones(reactants.shape[0])
+
+            # "nothing" stands in for an empty side, as it does in Reaction
+            empty = [np.diff(m.indptr) == 0 for m in (reactants, products)]
+            if any(e.any() for e in empty):
+                nothing = Species("nothing")
+                if nothing not in species:
+                    species.append(nothing)
+                    reactants.resize(reactants.shape[0], len(species))
+                    products.resize(products.shape[0], len(species))
+                col = species.index(nothing)
+                filler = [sparse.csr_matrix(
+                    (np.ones(e.sum(), dtype=np.int64),
+                     (np.flatnonzero(e), np.full(e.sum(), col))),
+                    shape=reactants.shape) for e in empty]
+                reactants = reactants + filler[0]
+                products = products + filler[1]
+
+            stoichiometry = Stoichiometry(
+                reactants, products, rates,
+                [i for i, sp in enumerate(species) if sp.name == "nothing"])
+
+            # one Expression per side, straight from the rows of the matrices
+            schema = np.array([sp.is_schema for sp in species], dtype=bool)
+            sides = []
+            for m in (stoichiometry.reactants, stoichiometry.products):
+                indptr = m.indptr.tolist()
+                terms = list(zip([species[i] for i in m.indices.tolist()],
+                                 m.data.tolist()))
+                is_schema = (np.add.reduceat(schema[m.indices], m.indptr[:-1])
+                             > 0).tolist()
+                sides.append([Expression(dict(terms[lo:hi]), s) for lo, hi, s
+                              in zip(indptr[:-1], indptr[1:], is_schema)])
+            system = [Reaction(lhs, rhs, k) for lhs, rhs, k
+                      in zip(*sides, stoichiometry.rates.tolist())]
+
+        crn = cls.__new__(cls)
+        crn.system = tuple(system)
+        crn.species = set(species)
+        crn.species_index = dict(enumerate(species))
+        crn.reactions_index = crn.get_reactions_index()
+        crn.stoichiometry = stoichiometry
+        crn.name = name if name is not None else id(crn)
+        return crn
+
+    @classmethod
+    def from_text(cls, text, name=None):
+        """
+        Builds a CRN from reactions written one per line, e.g.
+
+            A + 2B -> C @ 2.5
+            C -> 0 @ 0.1
+            0 -> A
+
+        See `crn.parse.parse_reactions` for the format. The species are
+        ordered by first appearance.
+        """
+        with utils.gc_paused():
+            names, reactants, products, rates = parse_reactions(text)
+        shape = (len(rates), len(names))
+        return cls.from_arrays(
+            names,
+            sparse.csr_matrix((reactants[2], reactants[:2]), shape=shape),
+            sparse.csr_matrix((products[2], products[:2]), shape=shape),
+            rates, name=name)
+
     def get_species(self):
         """
         Returns the set of species present in the CRN.
         """
         species = set()
-        for s in self.system:
-            species |= s.get_species()
+        for rxn in self.system:
+            species.update(rxn.reactants.species)
+            species.update(rxn.products.species)
         return species
 
     def get_species_index(self):
@@ -51,7 +196,9 @@ class CRN:
         This is meant for internal use, and won't be very useful for anyone
         using the CRN.
         """
-        return dict(enumerate(sorted(self.species)))
+        # same order as Species.__lt__, without calling it n log n times
+        return dict(enumerate(sorted(self.species, key=lambda sp: (
+            sp.is_schema, sp.name, id(sp) if sp.is_schema else 0))))
 
     def get_reactions_index(self):
         """
@@ -63,6 +210,109 @@ class CRN:
         """
         return dict(enumerate(self.system))
 
+    def get_stoichiometry(self):
+        """
+        Compile the reactions into a `Stoichiometry`: sparse reactant and
+        product matrices, an exponent matrix and a rate constant vector,
+        ordered like `self.reactions_index` and `self.species_index`.
+
+        This is meant for internal use, and won't be very useful for anyone
+        using the CRN.
+        """
+        return Stoichiometry.from_reactions(self.species_index, self.system)
+
+    @property
+    def rates(self):
+        """
+        The current rate constant of every reaction, in the same order as
+        specified in `self.reactions_index`. Read from the reactions every
+        time, so changes made with `Reaction.k` show up.
+        """
+        return np.array([rxn.coeff for rxn in self.system], dtype=float)
+
+    @property
+    def diffeq_system_func(self):
+        return self.rate_laws()
+
+    def rate_grid(self, values):
+        """
+        Returns a (sweep x reactions) array of rate constants for `sweep`:
+        every combination of the values in `values`, a map of reactions, or
+        their indices in `self.reactions_index`, to the rate constants to
+        try for them. The other reactions keep their current rate constant.
+        The last reaction in `values` varies fastest.
+
+            grid = sys.rate_grid({rxn1: [0.1, 1, 10], rxn2: [1, 2]})
+        """
+        columns = self._reaction_indices(values, "CRN.rate_grid")
+        combinations = np.array(list(product(*values.values())), dtype=float)
+        grid = np.tile(self.rates, (len(combinations), 1))
+        grid[:, columns] = combinations.reshape(len(combinations), -1)
+        return grid
+
+    def _reaction_indices(self, reactions, caller):
+        """
+        Returns the indices in `self.reactions_index` of `reactions`, which
+        can be Reactions of this CRN or indices already.
+        """
+        index = {id(rxn): i for i, rxn in self.reactions_index.items()}
+        indices = []
+        for rxn in reactions:
+            if type(rxn) is Reaction and id(rxn) in index:
+                indices.append(index[id(rxn)])
+            elif type(rxn) is int and rxn in self.reactions_index:
+                indices.append(rxn)
+            else:
+                raise ValueError(
+                    f"{caller}: {rxn} is not a reaction of this CRN or the "
+                    "index of one.")
+        return indices
+
+    def _stoichiometry(self, rates=None):
+        """
+        Returns `self.stoichiometry` with the rate constants `rates`, which
+        default to the current ones of the reactions, sharing everything
+        else with it.
+        """
+        rates = self.rates if rates is None else np.asarray(rates, float)
+        if rates.shape != (len(self.system),):
+            raise ValueError(
+                f"CRN: expected {len(self.system)} rate constants, one per "
+                f"reaction, got an array of shape {rates.shape}.")
+
+        if np.array_equal(rates, self.stoichiometry.rates):
+            return self.stoichiometry
+        return self.stoichiometry.with_rates(rates)
+
+    def initial_vector(self, amounts, dtype=float):
+        """
+        Returns the values in `amounts`, a map of Species or species names
+        to initial concentrations or counts, as a vector in the same order as
+        specified in `self.species_index`. Omitted species are 0.
+
+        This is meant for internal use, and won't be very useful for anyone
+        using the CRN.
+        """
+        names = {}
+
+        for s, c in amounts.items():
+            if type(s) not in (str, Species):
+                raise ValueError("CRN: initial concentrations dictionary got "
+                                 f"a key with type {type(s)}. Key type should "
+                                 "be Species or str.")
+
+            if type(s) is Species:
+                s = s.name
+
+            names[s] = c
+
+        v0 = np.zeros(len(self.species), dtype=dtype)
+
+        for i, s in self.species_index.items():
+            v0[i] = names.get(s.name, 0)
+
+        return v0
+
     def rate_law_for_species(self, s):
         """
         Returns the symbolic representation for the rate law of species `s`.
@@ -78,33 +328,56 @@ class CRN:
                              "parameter must be a species name (str) or a "
                              "Species instance.")
 
-        if type(s) is Species:
-            s = s.name
+        if type(s) is str:
+            s = Species(s)
 
         return sum(rxn.net_production(s) * rxn.flux() for rxn in self.system)
 
+    def conservation_laws(self):
+        """
+        Returns the conservation laws of the CRN: a list of maps of species
+        to coefficients, such that the sum of the concentrations (or
+        counts) of the species times their coefficients never changes. For
+        example, an enzyme E that binds to a substrate as C gives
+
+            [{E: 1.0, C: 1.0}, ...]
+
+        Every law has a different leading species, which `simulate` with
+        `reduce` leaves out of the integration. The "nothing" species is
+        never part of a law. See `Stoichiometry.conservation`.
+        """
+        independent, link = self.stoichiometry.conservation()
+        dependent = np.setdiff1d(np.arange(len(self.species)),
+                                 np.union1d(independent,
+                                            self.stoichiometry.inert))
+        link = link.tocsr()
+
+        laws = []
+        for i in dependent.tolist():
+            law = {self.species_index[i]: 1.0}
+            lo, hi = link.indptr[i], link.indptr[i + 1]
+            for j, c in zip(independent[link.indices[lo:hi]].tolist(),
+                            link.data[lo:hi].tolist()):
+                law[self.species_index[j]] = -c
+            laws.append(law)
+        return laws
+
     def rate_laws(self):
         """
         Returns a function that takes a list of species concentrations,
         in the same order as specified in `self.species_index`, and returns
         the a vector of the current rate of change of each species, again in
         the same order as specified in `self.species_index`.
-        """
-        laws = []
-
-        # Has to be iterated this way to laws is in order
-        for i in range(len(self.species_index)):
-            sp = self.species_index[i]
-            law = self.rate_law_for_species(sp)
-            for i, s in self.species_index.items():
-                sub = 1 if s == "nothing" else f"v[{i}]"
-                law = law.subs(s, sub)
-            laws.append(str(law))
 
-        func = f"lambda v, t: [{', '.join(laws)}]"
-        return eval(func)
+        The function evaluates the compiled `self.stoichiometry` with NumPy,
+        with the rate constants the reactions have when this is called.
+        Use `rate_law_for_species` for a symbolic rate law.
+        """
+        return self._stoichiometry().rhs
 
-    def stoch_simulate(self, amounts, t=20):
+    def stoch_simulate(self, amounts, t=20, seed=None, method="direct",
+                       path=None, rates=None, prune=False, stats=False,
+                       callback=None, **options):
         """
         Stochastic discrete simulation of the CRN until time `t` with initial
         molecule count `amounts`. The species that are omitted from the
@@ -113,31 +386,177 @@ class CRN:
         propensities all reach zero. If that's the case, the system has
         reached a steady state, and the simulation stops.
 
+        The simulation runs in-process on `self.stoichiometry`. To simulate
+        with StochPy instead, export the CRN with `write_pscfile`.
+
         args:
             amount: Dict[Species, int]
                 A map describing each species' initial count.
             t: Union[float, int]
                 The upper bound of the time to run the simulation to.
+            seed: Union[None, int, np.random.Generator]
+                Seed for the random number generator, so that runs can be
+                reproduced. Defaults to fresh entropy on every call.
+            method: str
+                "direct" for Gillespie's direct method, which recomputes
+                every propensity on every event, or "next_reaction" for
+                Gibson and Bruck's next reaction method, which only updates
+                the reactions affected by each event and is much faster on
+                large networks. "tau_leaping" is approximate: it fires
+                batches of reactions per step, which takes orders of
+                magnitude fewer steps when molecule counts are large.
+            path: Optional[str]
+                If given, the trajectory is streamed to this directory as it
+                is simulated instead of being kept in memory, and the
+                returned Simulation memory-maps it from there. See
+                `Simulation.open`.
+            rates: Optional[Sequence[float]]
+                The rate constant of every reaction, in the same order as
+                specified in `self.reactions_index`. Defaults to the current
+                ones. The network is not recompiled either way.
+            prune: bool
+                Only simulate the reactions that can fire at some point
+                given the species with a nonzero initial count, see
+                `Stoichiometry.reachable`. The counts of the species that
+                can never be produced stay at exactly 0.
+            stats: bool
+                Count the events and the reactions fired, time the phases
+                of the simulation, and attach the result to the returned
+                simulation as `stats`, see `crn.instrument.Stats`.
+            callback: Optional[Callable[[Stats], None]]
+                Called with the stats of the simulation as it runs, about
+                every 0.1 seconds, and once at the end. Implies `stats`.
+            options:
+                Passed on to the method. "tau_leaping" takes `epsilon`
+                (default 0.03), the largest expected relative change of a
+                propensity in one leap, `critical` (default 10), and
+                `ssa_steps` (default 100); see `crn.stochastic.tau_leaping`.
+
+        The returned simulation records why it stopped in `stop_reason`:
+        "time", or "steady_state" if no reaction could fire anymore.
         """
+        if method not in STOCHASTIC_METHODS:
+            raise ValueError(
+                f"CRN.stoch_simulate: unknown method '{method}'. Use one of "
+                f"{', '.join(map(repr, STOCHASTIC_METHODS))}.")
+
+        stats = (Stats(len(self.reactions_index), callback)
+                 if stats or callback is not None else None)
+        if stats is not None:
+            options["stats"] = stats
+
+        with phase(stats, "compile"):
+            stoichiometry = self._stoichiometry(rates)
+            counts = self.initial_vector(amounts, dtype=np.int64)
+            rng = np.random.default_rng(seed)
+            reactions = None
+            if prune:
+                stoichiometry, reactions, _ = stoichiometry.prune(
+                    counts > 0, species=False)
+
+        simulate = STOCHASTIC_METHODS[method]
+        columns, species = zip(*((i, sp)
+                                 for i, sp in self.species_index.items()
+                                 if sp.name != "nothing"))
+
+        with phase(stats, "simulate"):
+            # the simulators only record a last state at `t` if they got
+            # there, rather than running out of reactions to fire
+            if path is not None:
+                with TrajectoryWriter(path, species, columns) as out:
+                    recorder = out if stats is None else stats.recorder(out)
+                    simulate(stoichiometry, counts, t, rng, out=recorder,
+                             **options)
+                    out.stop_reason = ("time" if out.time >= t
+                                       else "steady_state")
+                with phase(stats, "record"):
+                    sim = Simulation.open(path)
+            else:
+                out = TrajectoryBuffer(len(counts),
+                                       dict(zip(species, columns)))
+                recorder = out if stats is None else stats.recorder(out)
+                simulate(stoichiometry, counts, t, rng, out=recorder,
+                         **options)
+                reason = "time" if out.times[-1] >= t else "steady_state"
+                with phase(stats, "record"):
+                    sim = Simulation(out, stochastic=True,
+                                     stop_reason=reason)
+
+        if stats is not None:
+            stats.reactions = [self.reactions_index[j]
+                               for j in range(len(self.reactions_index))]
+            stats.finish(True, reactions)
+            sim.stats = stats
+        return sim
+
+    def stoch_ensemble(self, amounts, t=20, n=1000, workers=None, seed=None,
+                       method="direct", resolution=100, reservoir=100,
+                       chunksize=100, rates=None, prune=False,
+                       quantiles=None, **options):
+        """
+        Runs `n` independent stochastic simulations of the CRN, like
+        `stoch_simulate`, and returns an `Ensemble` with the per-species
+        mean, variance and extremes of the molecule counts on `resolution`
+        evenly spaced times between 0 and `t`, and the quantiles of the
+        species in `quantiles`.
 
-        # Write psc file
-        pscfile = utils.datadir(f"{self.name}.psc")
-        self.write_pscfile(pscfile, amounts)
-
-        # invoke stochpy
-        smod = stochpy.SSA()
-        smod.Model(pscfile)
-        smod.DoStochSim(mode="time", end=t)
-
-        # return data
-        data = {}
-        for sp in self.species:
-            if sp.name != "nothing":
-                data[sp] = smod.data_stochsim.getSimData(sp.name)[:, 1]
-                if "time" not in data:
-                    data["time"] = smod.data_stochsim.getSimData(sp.name)[:, 0]
+        Each trajectory is sampled onto the time grid and folded into the
+        statistics as soon as it finishes, so memory does not grow with `n`.
+        Only the quantiles need whole trajectories: a uniform sample of at
+        most `reservoir` of them is kept, restricted to `quantiles`.
 
-        return Simulation(data, stochastic=True)
+        args:
+            amounts: Dict[Species, int]
+                A map describing each species' initial count.
+            t: Union[float, int]
+                The upper bound of the time to run the simulations to.
+            n: int
+                The number of trajectories.
+            workers: Optional[int]
+                The number of processes to spread the trajectories over.
+                Defaults to one per CPU; 1 runs everything in this process.
+            seed: Optional[int]
+                Seed from which every trajectory gets an independent random
+                stream. The result only depends on `seed`, not on `workers`.
+            method: str
+                The stochastic method, as in `stoch_simulate`.
+            resolution: int
+                The number of times in the common time grid.
+            reservoir: int
+                How many trajectories to keep a uniform random sample of for
+                `Ensemble.quantile`.
+            chunksize: int
+                The number of trajectories each task runs.
+            rates: Optional[Sequence[float]]
+                The rate constants, as in `stoch_simulate`.
+            prune: bool
+                Only simulate the reactions that can fire, as in
+                `stoch_simulate`.
+            quantiles: Optional[Sequence[Union[Species, str]]]
+                The species `Ensemble.quantile` can be asked about. No
+                quantiles if None.
+            options:
+                Passed on to the method, as in `stoch_simulate`.
+        """
+        if method not in STOCHASTIC_METHODS:
+            raise ValueError(
+                f"CRN.stoch_ensemble: unknown method '{method}'. Use one of "
+                f"{', '.join(map(repr, STOCHASTIC_METHODS))}.")
+
+        stoichiometry = self._stoichiometry(rates)
+        counts = self.initial_vector(amounts, dtype=np.int64)
+        if prune:
+            stoichiometry = stoichiometry.prune(counts > 0, species=False)[0]
+        grid = np.linspace(0, t, resolution)
+        columns, species = zip(*((i, sp)
+                                 for i, sp in self.species_index.items()
+                                 if sp.name != "nothing"))
+
+        return run_ensemble(stoichiometry, counts, t, grid,
+                            species, list(columns), n,
+                            STOCHASTIC_METHODS[method], options, seed=seed,
+                            workers=workers, chunksize=chunksize,
+                            reservoir=reservoir, quantiles=quantiles or ())
 
     def write_pscfile(self, filename, amounts):
         """
@@ -198,13 +617,20 @@ class CRN:
                     pscfile.write(f"{sp} = {amounts.get(sp, 0)}\n")
 
 
-    def simulate(self, conc, t=20, resolution=100):
+    def simulate(self, conc, t=20, resolution=100, method="LSODA",
+                 rtol=1e-6, atol=1e-9, steady_state=None, until=None,
+                 timeout=None, rates=None, sensitivities=None, reduce=False,
+                 prune=False, stats=False, callback=None):
         """
         Deterministic concentration-continuous simulation of the CRN until
         time t with initial concentrations `conc`.
         The species that are omitted from the dictionary of initial
         concentrations are assumed to have an initial concentration of 0.0.
 
+        The implicit methods are given the analytic mass-action Jacobian
+        from `self.stoichiometry`, so stiff networks don't pay for a finite
+        difference Jacobian on every step.
+
         args:
             conc: Dict[Species, float]
                 A map describing each species' initial concentration.
@@ -212,52 +638,299 @@ class CRN:
                 The upper bound of the time to run the simulation to.
             resolution: int
                 How many time steps to simulate between times [0, t).
+            method: str
+                Any `scipy.integrate` ODE solver: "LSODA", "BDF", "Radau",
+                "RK45", "RK23" or "DOP853". "LSODA" switches between stiff
+                and non-stiff methods on its own; "BDF" and "Radau" are
+                better suited for very stiff networks.
+            rtol: float
+                Relative tolerance of the solver.
+            atol: float
+                Absolute tolerance of the solver.
+            steady_state: Optional[float]
+                Stop early once every species changes slower than this,
+                that is once the largest |d[X]/dt| is below it.
+            until: Optional[Callable[Dict[Species, float], bool]]
+                Called after every solver step with a map of every species
+                to its current concentration. Stop early once it returns
+                True.
+            timeout: Optional[float]
+                Stop early once the simulation has taken this many seconds
+                of wall-clock time.
+            rates: Optional[Sequence[float]]
+                The rate constant of every reaction, in the same order as
+                specified in `self.reactions_index`. Defaults to the current
+                ones. The network is not recompiled either way.
+            sensitivities: Union[None, bool, Sequence[Union[Reaction, int]]]
+                Also integrate the forward sensitivity equations, giving
+                the derivative of every series with respect to the rate
+                constant of every reaction, or of the reactions listed, in
+                the same solve. See `crn.sensitivity.Sensitivities`. The
+                system grows by a copy of the species per rate constant, so
+                prefer "BDF" or "Radau" on large networks, which take the
+                Jacobian as a sparse matrix.
+            reduce: bool
+                Only integrate the species that are not determined by a
+                conservation law of the network, see `conservation_laws`,
+                and reconstruct the others from them. The returned series
+                are the same, but the system is smaller and its Jacobian
+                is not singular. Finding the laws takes a dense QR
+                factorization of the stoichiometry the first time. With
+                "BDF" and "Radau", laws that span a large part of the
+                network are kept, as they would make the sparse Jacobian
+                dense. Can't be combined with `sensitivities`.
+            prune: bool
+                Only integrate the species and reactions that can be
+                reached from the species with a nonzero initial
+                concentration, see `Stoichiometry.reachable`. The others
+                stay at exactly 0. Can't be combined with `sensitivities`.
+            stats: bool
+                Count the solver steps and evaluations, time the phases of
+                the simulation, and attach the result to the returned
+                simulation as `stats`, see `crn.instrument.Stats`.
+            callback: Optional[Callable[[Stats], None]]
+                Called with the stats of the simulation as it runs, about
+                every 0.1 seconds, and once at the end. Implies `stats`.
+
+        The returned simulation records why it stopped in `stop_reason`:
+        "time", "steady_state", "until" or "timeout", and when in
+        `stop_time`. If it stopped early, its last sample is at
+        `stop_time`. With `sensitivities`, it also has the (time x species
+        x parameters) array `sensitivities`, and the reactions they are
+        taken with respect to in `parameters`.
         """
 
-        t = np.linspace(0, t, resolution)
-
-        conc_temp = {}
-
-        for s, c in conc.items():
-            if type(s) not in (str, Species):
-                raise ValueError("CRN.simulate: initial concentrations "
-                                 f"dictionary got a key with type {type(s)}. "
-                                 "Key type should be Species or str.")
+        if (reduce or prune) and sensitivities:
+            option = "reduce" if reduce else "prune"
+            raise ValueError(f"CRN.simulate: '{option}' and 'sensitivities' "
+                             "can't be combined.")
+
+        stats = (Stats(len(self.reactions_index), callback)
+                 if stats or callback is not None else None)
+
+        with phase(stats, "compile"):
+            t = np.linspace(0, t, resolution)
+            v0 = self.initial_vector(conc)
+            n = len(v0)
+
+            system = self._stoichiometry(rates)
+            kept = None
+            if prune:
+                system, _, kept = system.prune(v0 > 0)
+                v0 = v0[kept]
+            if reduce:
+                # the sparse solvers pay for laws with many terms in
+                # fill-in, see ReducedSystem
+                max_terms = (int(np.sqrt(len(self.species))) + 1
+                             if method in ("BDF", "Radau") else None)
+                system = ReducedSystem(system, v0, max_terms)
+                v0 = system.y0
+
+        def expand(v):
+            # the concentrations of every species from the ones integrated
+            if reduce:
+                v = system.full(v)
+            if kept is not None:
+                full = np.zeros(v.shape[:-1] + (n,))
+                full[..., kept] = v
+                v = full
+            return v
+
+        def reached(t, v):
+            v = expand(v)
+            return until({s: v[i] for i, s in self.species_index.items()})
+
+        predicate = reached if until is not None else None
+
+        if sensitivities is True:
+            parameters = list(self.reactions_index)
+        elif sensitivities:
+            parameters = self._reaction_indices(sensitivities,
+                                                "CRN.simulate")
+        if sensitivities:
+            with phase(stats, "compile"):
+                system = Sensitivities(system, parameters)
+                v0 = system.initial(v0)
+
+        species = [self.species_index[i] for i in range(len(self.species))]
+        with phase(stats, "simulate"):
+            times, sol, reason = integrate(
+                system, v0, t, method, rtol, atol,
+                steady_state=steady_state, until=predicate, timeout=timeout,
+                stats=stats)
+
+            with phase(stats, "record"):
+                if sensitivities:
+                    sol, derivatives = system.split(sol)
+                else:
+                    sol = expand(sol)
+                sim = Simulation.from_array(times, sol, species,
+                                            stop_reason=reason)
+
+        if sensitivities:
+            sim.sensitivities = derivatives
+            sim.parameters = [self.reactions_index[j] for j in parameters]
+        if stats is not None:
+            stats.finish(False)
+            sim.stats = stats
+        return sim
+
+    def simulate_batch(self, conc, t=20, resolution=100, method="BDF",
+                       rtol=1e-6, atol=1e-9, workers=1, chunksize=None,
+                       rates=None):
+        """
+        Deterministic simulation of the CRN from many initial conditions at
+        once. Each chunk of initial conditions is integrated as one stacked
+        ODE system with a block diagonal Jacobian, and chunks can be spread
+        over a process pool.
 
-            if type(s) is Species:
-                s = s.name
+        args:
+            conc: np.ndarray
+                (batch x species) array of initial concentrations, one row
+                per simulation, with columns in the same order as specified
+                in `self.species_index`.
+            t: Union[float, int]
+                The upper bound of the time to run the simulations to.
+            resolution: int
+                How many time steps to simulate between times [0, t).
+            method, rtol, atol:
+                As in `simulate`. The default method is "BDF" because it
+                takes the Jacobian as a sparse matrix, which LSODA can't.
+            workers: Optional[int]
+                The number of processes to spread the chunks over. None
+                means one per CPU; 1 runs everything in this process.
+            chunksize: Optional[int]
+                The number of initial conditions integrated together.
+                Defaults to splitting the batch evenly over the workers.
+                Every system in a chunk shares the solver's step size, so
+                smaller chunks can help when the batch mixes stiff and
+                non-stiff initial conditions.
+            rates: Optional[Sequence[float]]
+                The rate constants, as in `simulate`.
+
+        Returns a (batch x time x species) array. The times are
+        `np.linspace(0, t, resolution)`.
+        """
+        stoichiometry = self._stoichiometry(rates)
+        conc = np.asarray(conc, dtype=float)
+        if conc.ndim != 2 or conc.shape[1] != len(self.species):
+            raise ValueError(
+                "CRN.simulate_batch: expected a (batch x species) array with "
+                f"{len(self.species)} columns, got shape {conc.shape}.")
 
-            conc_temp[s] = c
+        t = np.linspace(0, t, resolution)
+        if workers is None:
+            workers = os.cpu_count()
+        if chunksize is None:
+            chunksize = max(1, -(-len(conc) // workers))
 
-        conc = conc_temp
+        chunks = [(stoichiometry, conc[lo:lo + chunksize], t, method,
+                   rtol, atol) for lo in range(0, len(conc), chunksize)]
 
-        v0 = [0] * len(self.species)
+        if workers == 1 or len(chunks) <= 1:
+            sols = list(map(integrate_chunk, chunks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                sols = list(pool.map(integrate_chunk, chunks))
 
-        for i, s in self.species_index.items():
-            v0[i] = conc.get(s, 0)
+        if not sols:
+            return np.empty((0, resolution, len(self.species)))
+        return np.concatenate(sols)
 
-        sol = odeint(self.diffeq_system_func, v0, t)
+    def sweep(self, conc, rates, t=20, resolution=100, method="BDF",
+              rtol=1e-6, atol=1e-9, workers=1, chunksize=None):
+        """
+        Deterministic simulation of the CRN from the initial concentrations
+        `conc` under many sets of rate constants, sharing one compiled
+        network. Like in `simulate_batch`, each chunk of rate vectors is
+        integrated as one stacked ODE system, and chunks can be spread over
+        a process pool.
 
-        sol_dict = {'time': t}
+        args:
+            conc: Dict[Species, float]
+                A map describing each species' initial concentration.
+            rates: Union[np.ndarray, Dict[Union[Reaction, int],
+                                          Sequence[float]]]
+                (sweep x reactions) array of rate constants, one row per
+                simulation, with columns in the same order as specified in
+                `self.reactions_index`. A map of reactions to the rate
+                constants to try for them is expanded with `rate_grid`.
+            t, resolution, method, rtol, atol, workers, chunksize:
+                As in `simulate_batch`, with chunks of rate vectors rather
+                than of initial conditions.
+
+        Returns a (sweep x time x species) array. The times are
+        `np.linspace(0, t, resolution)`.
+        """
+        if isinstance(rates, dict):
+            rates = self.rate_grid(rates)
+        rates = np.asarray(rates, dtype=float)
+        if rates.ndim != 2 or rates.shape[1] != len(self.system):
+            raise ValueError(
+                "CRN.sweep: expected a (sweep x reactions) array with "
+                f"{len(self.system)} columns, got shape {rates.shape}.")
 
-        for i, s in self.species_index.items():
-            sol_dict[s] = sol[:, i]
+        v0 = self.initial_vector(conc)
+        t = np.linspace(0, t, resolution)
+        if workers is None:
+            workers = os.cpu_count()
+        if chunksize is None:
+            chunksize = max(1, -(-len(rates) // workers))
+
+        chunks = [(self.stoichiometry.with_rates(rates[lo:lo + chunksize]),
+                   np.tile(v0, (len(rates[lo:lo + chunksize]), 1)), t,
+                   method, rtol, atol)
+                  for lo in range(0, len(rates), chunksize)]
+
+        if workers == 1 or len(chunks) <= 1:
+            sols = list(map(integrate_chunk, chunks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                sols = list(pool.map(integrate_chunk, chunks))
 
-        return Simulation(sol_dict)
+        if not sols:
+            return np.empty((0, resolution, len(self.species)))
+        return np.concatenate(sols)
 
-    def schema_simulate(self, initial_counts, time=None, steps=None):
+    def schema_simulate(self, initial_counts, time=None, steps=None,
+                        seed=None, path=None, stats=False, callback=None):
         """
         Stochastic simulator for reaction schema.
-        """
-        def possible_reactions(state):
-            rxns = []
-            for rxn in self.system:
-                if rxn.is_schema:
-                    for matching_rxn in rxn.possible_reactions(state):
-                        rxns.append(matching_rxn)
-                rxns.append(rxn)
-            return rxns
 
+        The reactions instantiated from the schemas are kept in a
+        `SchemaIndex`, which is only updated when a species appears or
+        disappears, and propensities are cached in a `SumTree`, which is
+        only updated for reactions whose reactants changed. Each step costs
+        about O(log n) in the number of possible reactions.
+
+        args:
+            initial_counts: Dict[Species, int]
+                A map describing each species' initial count.
+            time: Optional[float]
+                The time to simulate up to.
+            steps: Optional[int]
+                The number of reactions to simulate. Defaults to 1000 if
+                neither `time` nor `steps` is given.
+            seed: Union[None, int, np.random.Generator]
+                Seed for the random number generator, so that runs can be
+                reproduced.
+            path: Optional[str]
+                If given, the events are spilled to this directory during
+                the simulation and turned into a trajectory there at the
+                end, which the returned Simulation memory-maps. See
+                `Simulation.open`.
+            stats: bool
+                Count the events and the reactions fired, time the phases
+                of the simulation, and attach the result to the returned
+                simulation as `stats`, see `crn.instrument.Stats`.
+            callback: Optional[Callable[[Stats], None]]
+                Called with the stats of the simulation as it runs, about
+                every 0.1 seconds, and once at the end. Implies `stats`.
+
+        The returned simulation records why it stopped in `stop_reason`:
+        "time", "steps", or "steady_state" if no reaction could fire
+        anymore.
+        """
         for sp in initial_counts:
             if sp.has_groups():
                 raise ValueError(
@@ -284,60 +957,37 @@ class CRN:
                     "passed. Pass in one or the other")
 
 
-        curr_time = curr_steps = 0
         state = {sp: count for sp, count in initial_counts.items() if count}
+        rng = np.random.default_rng(seed)
+        stats = (Stats(callback=callback)
+                 if stats or callback is not None else None)
+
+        with phase(stats, "simulate"):
+            log = schema_simulation(self.system, state, time, steps, rng,
+                                    spill=path, stats=stats)
+            if stats is not None:
+                # the reactions instantiated from the schemas are only
+                # known once the simulation is over
+                stats.reactions = list(log.reactions)
+                firings = np.bincount(log.events,
+                                      minlength=len(log.reactions))
+            with phase(stats, "record"):
+                if path is not None:
+                    log.write(path)
+                    sim = Simulation.open(path)
+                else:
+                    sim = Simulation(log, stochastic=True,
+                                     stop_reason=log.stop_reason)
 
-        sim = {}
-        history = {}
-        sim["time"] = [0]
-        sim["reactions"] = []
-        for sp, count in state.items():
-            sim[sp] = [count]
-
-        # TODO (enricozb): add species history
-
-
-        while True:
-            if curr_time >= time or curr_steps >= steps:
-                break
-
-            # Grab reactions and propensities
-            rxns = possible_reactions(state)
-            props = [rxn.propensity(state) for rxn in rxns]
-
-            # Pick reaction to occur
-            p_tot = sum(props)
-
-            if p_tot == 0:
-                print("simulation ended before reaching 'time' or 'steps'")
-                break
-
-            rxn = choice(rxns, p=[p / p_tot for p in props])
-            sim["reactions"].append(rxn)
-
-            # Pick dt and register chosen reaction effects
-            for r, c in rxn.reactants.species.items():
-                state[r] -= c
-                sim[r].append(state[r])
-                if state[r] == 0:
-                    del state[r]
-
-            for p, c in rxn.products.species.items():
-                if p not in state:
-                    state[p] = 0
-                    sim[p] = [0] * (curr_steps + 1)
-                state[p] += c
-                sim[p].append(state[p])
-
-            dt = -log(uniform(0, 1)) / p_tot
-            curr_time += dt
-            curr_steps += 1
-
-        return Simulation(sim)
-
+        if stats is not None:
+            stats.finish(False)
+            stats.firings = firings
+            sim.stats = stats
+        return sim
 
     def validate(self, func, *, input_species, output_species, N=100,
-            eps=1e-2, t=500):
+            eps=1e-2, t=500, workers=1, chunksize=None, vectorized=False,
+            steady_state=None):
         """
         Determine if the CRN `self` actually describes the computation in
         function `func`. This is a probabalistic verification: it runs
@@ -345,21 +995,121 @@ class CRN:
         then computes the desired function output and checks if the CRNs
         simulation is within `eps` of `func`s output.
 
+        Validation stops at the first counterexample found. With `workers`
+        other than 1 the simulations are spread over a process pool, and the
+        outstanding ones are cancelled as soon as any of them fails.
+
         args:
             func: Callable[Dict[Expression, float], float]
                 This function takes in the initial concentrations of the
                 input species to the CRN and outputs a number computed from
-                these initial concentrations.
+                these initial concentrations. It is called on every sample
+                once that sample is simulated.
+            output_species: Union[Species, str]
+                The species whose final concentration should match the
+                output of `func`, or its name.
+            workers: Optional[int]
+                The number of processes to run simulations in. None means
+                one per CPU; 1 runs everything in this process.
+            chunksize: Optional[int]
+                How many samples each task simulates. Defaults to 1 in this
+                process, so no simulation runs past a counterexample, and to
+                a few tasks per worker otherwise.
+            vectorized: bool
+                If True, `func` is called once with a map of every input
+                species to an array of all `N` sampled concentrations, and
+                must return an array of `N` outputs. The samples of each
+                chunk are also integrated together as one stacked system.
+            steady_state: Optional[float]
+                Stop each simulation before `t` once it settles, as in
+                `simulate`.
+
+        The returned dictionary always has "success", the number of
+        "samples" simulated, the "elapsed" wall time in seconds and the
+        "throughput" in samples per second.
         """
-        for i in range(N):
-            species = {sp : random() * 10 for sp in input_species}
-            theoretical = func(species)
-            sim = self.simulate(species, t=t)
-            simulated = sim[output_species][-1]
-
-            if abs(theoretical - simulated) > eps:
-                return {"success": False, "sim": sim, **species,
-                        "theoretical": theoretical, "simulated": simulated}
-
-        return {"success": True}
-
+        if type(output_species) not in (str, Species):
+            raise ValueError("CRN.validate: output_species must be a species "
+                             "name (str) or a Species instance.")
+        if type(output_species) is str:
+            output_species = Species(output_species)
+
+        column = next((i for i, sp in self.species_index.items()
+                       if sp == output_species), None)
+        if column is None:
+            raise ValueError(f"CRN.validate: output species {output_species} "
+                             "is not in the CRN.")
+
+        start = time.perf_counter()
+        samples = [{sp : random() * 10 for sp in input_species}
+                   for _ in range(N)]
+
+        if vectorized:
+            theoretical = np.asarray(func({
+                sp: np.array([species[sp] for species in samples])
+                for sp in input_species}), dtype=float)
+        else:
+            # filled in as the simulations come back, so `func` is not
+            # called on the samples past a counterexample
+            theoretical = {}
+
+        if workers is None:
+            workers = os.cpu_count()
+        if chunksize is None:
+            chunksize = 1 if workers == 1 else max(1, N // (4 * workers))
+
+        v0 = np.array([self.initial_vector(species) for species in samples])
+        stoichiometry = self._stoichiometry()
+        chunks = {lo: (stoichiometry, v0[lo:lo + chunksize], t,
+                       vectorized, steady_state)
+                  for lo in range(0, N, chunksize)}
+
+        def stats(done):
+            elapsed = time.perf_counter() - start
+            return {"samples": done, "elapsed": elapsed,
+                    "throughput": done / elapsed if elapsed else float("inf")}
+
+        def check(lo, states):
+            for i, simulated in enumerate(states[:, column], lo):
+                if not vectorized:
+                    theoretical[i] = func(samples[i])
+                if abs(theoretical[i] - simulated) > eps:
+                    return i, simulated
+            return None
+
+        done = 0
+        failure = None
+
+        if workers == 1:
+            for lo, chunk in chunks.items():
+                states = final_states(*chunk)
+                done += len(states)
+                failure = check(lo, states)
+                if failure:
+                    break
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            pending = {pool.submit(final_states, *chunk): lo
+                       for lo, chunk in chunks.items()}
+            try:
+                while pending and not failure:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        lo = pending.pop(future)
+                        states = future.result()
+                        done += len(states)
+                        failure = failure or check(lo, states)
+            finally:
+                # the chunks already running can't be interrupted, but none
+                # is left running once this returns
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        if failure:
+            i, simulated = failure
+            species = samples[i]
+            sim = self.simulate(species, t=t, steady_state=steady_state)
+            return {"success": False, "sim": sim, **species,
+                    "theoretical": theoretical[i], "simulated": simulated,
+                    **stats(done)}
+
+        return {"success": True, **stats(done)}
@@ -0,0 +1,216 @@
+import numpy as np
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from crn import Species
+
+def resample(times, states, grid):
+    """
+    Samples the piecewise constant trajectory given by event `times` and the
+    `states` right after each event at the times in `grid`.
+    """
+    index = np.searchsorted(times, grid, side="right") - 1
+    return states[np.maximum(index, 0)]
+
+
+class Ensemble:
+    """
+    Summary statistics of many stochastic simulations of a CRN sampled on a
+    common time grid. The statistics are accumulated one trajectory at a
+    time, so the trajectories themselves are never kept. Quantiles are the
+    exception: they are estimated from a uniform random sample of at most
+    `reservoir` trajectories, of only the species listed in `quantiles`.
+
+    This class probably won't be constructed by a user; it is returned by
+    `CRN.stoch_ensemble`.
+
+    args:
+        species: List[Species]
+            The species whose counts are tracked, in column order.
+        time: np.ndarray
+            The time grid the trajectories are sampled on.
+        reservoir: int
+            How many trajectories to keep a uniform random sample of, for
+            estimating quantiles.
+        rng: np.random.Generator
+            Source of randomness for the reservoir sample.
+        quantiles: Sequence[Union[Species, str]]
+            The species to keep the sampled trajectories of. Quantiles are
+            disabled if empty.
+
+    attributes:
+        time: np.ndarray
+            The time grid the trajectories are sampled on.
+        n: int
+            The number of trajectories accumulated so far.
+    """
+    def __init__(self, species, time, reservoir=100, rng=None,
+                 quantiles=()):
+        self.species = list(species)
+        self.column = {sp: i for i, sp in enumerate(self.species)}
+        self.time = np.asarray(time)
+        self.n = 0
+
+        shape = (len(self.time), len(self.species))
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self._min = np.full(shape, np.inf)
+        self._max = np.full(shape, -np.inf)
+        # the columns kept in the reservoir, and where they are kept
+        sampled = dict.fromkeys(self._columns(s) for s in quantiles)
+        self._sampled = {column: i for i, column in enumerate(sampled)}
+        self._capacity = reservoir if self._sampled else 0
+        # (time x sampled species) arrays, only allocated when added
+        self._reservoir = []
+        self._rng = np.random.default_rng(rng)
+
+    def add(self, sample):
+        """
+        Accumulates one trajectory, sampled on `self.time`.
+        """
+        self.n += 1
+        delta = sample - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (sample - self._mean)
+        np.minimum(self._min, sample, out=self._min)
+        np.maximum(self._max, sample, out=self._max)
+
+        # Algorithm R: the reservoir stays a uniform sample of everything
+        if self.n <= self._capacity:
+            self._reservoir.append(sample[:, list(self._sampled)])
+        elif self._capacity:
+            slot = self._rng.integers(self.n)
+            if slot < self._capacity:
+                self._reservoir[slot] = sample[:, list(self._sampled)]
+
+    def merge(self, other):
+        """
+        Folds the statistics of `other`, an Ensemble over the same species
+        and time grid, into `self`.
+        """
+        if other.n == 0:
+            return
+        n = self.n + other.n
+
+        delta = other._mean - self._mean
+        self._mean += delta * other.n / n
+        self._m2 += other._m2 + delta ** 2 * self.n * other.n / n
+        np.minimum(self._min, other._min, out=self._min)
+        np.maximum(self._max, other._max, out=self._max)
+
+        # the arrays are shared, not copied: neither is ever written to
+        ours, theirs = self._reservoir, other._reservoir
+        size = min(self._capacity, len(ours) + len(theirs))
+        take = self._rng.hypergeometric(self.n, other.n, size) if size else 0
+        take = min(max(take, size - len(theirs)), len(ours))
+        self._reservoir = (
+            [ours[i] for i in self._rng.permutation(len(ours))[:take]]
+            + [theirs[i]
+               for i in self._rng.permutation(len(theirs))[:size - take]])
+        self.n = n
+
+    def _columns(self, s):
+        if type(s) is str:
+            s = Species(s)
+        if s not in self.column:
+            raise KeyError(f"Ensemble: species {s} is not in the ensemble.")
+        return self.column[s]
+
+    def mean(self, s):
+        """
+        Returns the mean count of species `s` at every time in `self.time`.
+        """
+        return self._mean[:, self._columns(s)]
+
+    def var(self, s):
+        """
+        Returns the sample variance of the count of species `s` at every
+        time in `self.time`.
+        """
+        if self.n < 2:
+            return np.full(len(self.time), np.nan)
+        return self._m2[:, self._columns(s)] / (self.n - 1)
+
+    def std(self, s):
+        """
+        Returns the sample standard deviation of the count of species `s`
+        at every time in `self.time`.
+        """
+        return np.sqrt(self.var(s))
+
+    def min(self, s):
+        """
+        Returns the smallest count of species `s` seen at every time in
+        `self.time`.
+        """
+        return self._min[:, self._columns(s)]
+
+    def max(self, s):
+        """
+        Returns the largest count of species `s` seen at every time in
+        `self.time`.
+        """
+        return self._max[:, self._columns(s)]
+
+    def quantile(self, s, q):
+        """
+        Returns the `q` quantile(s) of the count of species `s` at every time
+        in `self.time`, estimated from the reservoir sample. `s` must be one
+        of the species in `quantiles`.
+        """
+        column = self._sampled.get(self._columns(s))
+        if column is None or self._capacity == 0:
+            raise RuntimeError(
+                f"Ensemble.quantile: species {s} was not sampled. Run the "
+                "ensemble with it in `quantiles` and `reservoir` greater "
+                "than 0.")
+        sample = np.stack([trajectory[:, column]
+                           for trajectory in self._reservoir])
+        return np.quantile(sample, q, axis=0)
+
+
+def run_ensemble(stoichiometry, counts, t, grid, species, columns, n,
+                 simulate, options, seed=None, workers=None, chunksize=100,
+                 reservoir=100, quantiles=()):
+    """
+    Runs `n` stochastic simulations with `simulate`, one of the functions in
+    `crn.stochastic`, and reduces them into an `Ensemble`.
+
+    Every trajectory gets its own random stream spawned from `seed`, and the
+    trajectories are split into chunks of `chunksize` in a fixed way, so the
+    result only depends on `seed`, not on `workers`. With `workers` other
+    than 1 the chunks run in a process pool of that many processes
+    (default: one per CPU).
+    """
+    starts = range(0, n, chunksize)
+    # one stream per trajectory, plus one per chunk for its reservoir
+    seeds = np.random.SeedSequence(seed).spawn(n + len(starts))
+    chunks = [(stoichiometry, counts, t, grid, species, columns, simulate,
+               options, seeds[lo:lo + chunksize], seeds[n + i], reservoir,
+               quantiles)
+              for i, lo in enumerate(starts)]
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    ensemble = Ensemble(species, grid, reservoir, np.random.default_rng(seed),
+                        quantiles)
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            ensemble.merge(_run_chunk(*chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_run_chunk, *zip(*chunks)):
+                ensemble.merge(part)
+
+    return ensemble
+
+def _run_chunk(stoichiometry, counts, t, grid, species, columns, simulate,
+               options, seeds, chunk_seed, reservoir, quantiles):
+    ensemble = Ensemble(species, grid, reservoir,
+                        np.random.default_rng(chunk_seed), quantiles)
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        trajectory = simulate(stoichiometry, counts, t, rng, **options)
+        ensemble.add(trajectory.resample(grid, columns))
+    return ensemble
@@ -0,0 +1,200 @@
+import numpy as np
+import time
+
+from contextlib import contextmanager, nullcontext
+
+class Stats:
+    """
+    Counters and timings of a single simulation, collected when a simulator
+    is run with `stats=True` or a `callback`. The simulators only touch it
+    behind an `if stats is not None`, so they run at full speed without it.
+
+    Every simulator counts its steps and their sizes: solver steps for the
+    deterministic simulators, events for the exact stochastic ones and
+    leaps for tau-leaping. The stochastic simulators also count how often
+    each reaction fired, and the deterministic ones how often the solver
+    evaluated the rate laws and their Jacobian.
+
+    args:
+        n_reactions: int
+            The number of reactions that can fire.
+        callback: Optional[Callable[[Stats], None]]
+            Called with these stats while the simulation runs, at most
+            every `interval` seconds of wall-clock time, and once more at
+            the end.
+        interval: float
+            The least wall-clock time between two calls to `callback`.
+
+    attributes:
+        time: float
+            The simulated time reached so far.
+        steps: int
+            The number of steps taken.
+        step_sizes: np.ndarray
+            The size of every step taken, in simulated time.
+        rejected: Optional[int]
+            The number of steps rejected and retried with a smaller size,
+            for the simulators that report it. SciPy's solvers don't, so
+            this is None for the deterministic simulators.
+        rejected_step_sizes: np.ndarray
+            The size of every rejected step, where known.
+        firings: Optional[np.ndarray]
+            How often every reaction fired, for the stochastic simulators.
+        reactions: Optional[List[Reaction]]
+            The reactions `firings` counts, when known.
+        rhs_evaluations: Optional[int]
+            The number of evaluations of the rate laws.
+        jacobian_evaluations: Optional[int]
+            The number of evaluations of the Jacobian.
+        lu_decompositions: Optional[int]
+            The number of LU decompositions done by an implicit solver.
+        timings: Dict[str, float]
+            Wall-clock seconds spent in every phase of the simulation:
+            "compile" for preparing the network, "simulate" for the
+            simulator itself and "record" for storing the trajectory.
+    """
+    def __init__(self, n_reactions=0, callback=None, interval=0.1):
+        self.callback = callback
+        self.interval = interval
+        self.time = 0.0
+        self.steps = 0
+        self.rejected = None
+        self.firings = None
+        self.reactions = None
+        self.rhs_evaluations = None
+        self.jacobian_evaluations = None
+        self.lu_decompositions = None
+        self.timings = {"compile": 0.0, "simulate": 0.0, "record": 0.0}
+
+        self._firings = [0] * n_reactions
+        self._step_sizes = []
+        self._rejected_step_sizes = []
+        self._last_call = time.perf_counter()
+
+    @property
+    def step_sizes(self):
+        return np.array(self._step_sizes, dtype=float)
+
+    @property
+    def rejected_step_sizes(self):
+        return np.array(self._rejected_step_sizes, dtype=float)
+
+    def step(self, t, size):
+        """
+        Records a step of `size` that took the simulation to time `t`.
+        """
+        self.time = t
+        self.steps += 1
+        self._step_sizes.append(size)
+
+        if self.callback is not None:
+            now = time.perf_counter()
+            if now - self._last_call >= self.interval:
+                self._last_call = now
+                self.callback(self)
+
+    def fire(self, j, t, size):
+        """
+        Records that reaction `j` fired at time `t`, a step of `size` after
+        the previous event.
+        """
+        self._firings[j] += 1
+        self.step(t, size)
+
+    def leap(self, fired, t, size):
+        """
+        Records a leap of `size` up to time `t` that fired every reaction
+        the number of times in `fired`.
+        """
+        for j in np.flatnonzero(fired).tolist():
+            self._firings[j] += int(fired[j])
+        self.step(t, size)
+
+    def reject(self, size):
+        """
+        Records that a step of `size` was rejected.
+        """
+        self.rejected = (self.rejected or 0) + 1
+        self._rejected_step_sizes.append(size)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Adds the wall-clock time spent in the block to `timings[name]`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (self.timings.get(name, 0.0)
+                                  + time.perf_counter() - start)
+
+    def timed(self, name, func):
+        """
+        Returns `func` wrapped so that the time spent in it is added to
+        `timings[name]`.
+        """
+        timings = self.timings
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] += time.perf_counter() - start
+
+        timings.setdefault(name, 0.0)
+        return timed
+
+    def recorder(self, out):
+        """
+        Returns `out`, a recorder like `TrajectoryBuffer`, with the time
+        spent in `append` added to `timings["record"]`.
+        """
+        return TimedRecorder(out, self)
+
+    def finish(self, stochastic, reactions=None):
+        """
+        Ends the simulation: keeps the firing counts if it was stochastic,
+        takes the time spent recording out of `timings["simulate"]`, and
+        calls the callback a last time.
+
+        args:
+            stochastic: bool
+                Whether the simulator counted the reactions fired.
+            reactions: Optional[np.ndarray]
+                If the simulator only ran a subnetwork, the indices of its
+                reactions in the whole network.
+        """
+        if stochastic:
+            firings = np.array(self._firings, dtype=np.int64)
+            if reactions is not None:
+                firings, fired = np.zeros_like(firings), firings
+                firings[reactions] = fired[:len(reactions)]
+            self.firings = firings
+        self.timings["simulate"] = max(
+            self.timings["simulate"] - self.timings["record"], 0.0)
+        if self.callback is not None:
+            self.callback(self)
+
+    def __repr__(self):
+        timings = ", ".join(f"{name} {seconds:.3g}s"
+                            for name, seconds in self.timings.items())
+        return f"Stats(steps={self.steps}, time={self.time:g}, {timings})"
+
+
+def phase(stats, name):
+    """
+    Returns `stats.phase(name)`, or a context manager that does nothing if
+    `stats` is None.
+    """
+    return nullcontext() if stats is None else stats.phase(name)
+
+
+class TimedRecorder:
+    """
+    Wraps a recorder so that `Stats` can time its `append`.
+    """
+    def __init__(self, out, stats):
+        self.out = out
+        self.append = stats.timed("record", out.append)
@@ -0,0 +1,155 @@
+import numpy as np
+import time
+
+# solve_ivp methods that make use of a Jacobian
+IMPLICIT_METHODS = ("LSODA", "BDF", "Radau")
+
+METHODS = ("RK23", "RK45", "DOP853", "Radau", "BDF", "LSODA")
+
+def integrate(stoichiometry, v0, t, method="LSODA", rtol=1e-6, atol=1e-9,
+              steady_state=None, until=None, timeout=None, stats=None):
+    """
+    Integrates the mass-action ODEs of `stoichiometry` with one of the
+    `scipy.integrate` solvers, giving the implicit methods the analytic
+    Jacobian.
+
+    The solver is stepped by hand so that the termination criteria can be
+    checked after every step; integration stops at the end of the first
+    step that meets one of them.
+
+    args:
+        stoichiometry: Stoichiometry
+            The compiled CRN to simulate.
+        v0: np.ndarray
+            The initial concentration of every species, or a (batch x
+            species) array of initial concentrations, which are integrated
+            together as one stacked system.
+        t: np.ndarray
+            The times to report the solution at, starting with the initial
+            time.
+        method, rtol, atol:
+            As in `CRN.simulate`.
+        steady_state: Optional[float]
+            Stop once no species changes faster than this, i.e. once the
+            largest |dx/dt| drops below it.
+        until: Optional[Callable[[float, np.ndarray], bool]]
+            Stop once `until(t, v)` is true for the current time and
+            concentrations.
+        timeout: Optional[float]
+            Stop once the integration has taken this many seconds.
+        stats: Optional[crn.instrument.Stats]
+            If given, every solver step is counted in it, the time spent
+            interpolating the solution at the times in `t` is recorded,
+            and the solver's evaluation counts are stored in it at the end.
+
+    Returns the times reported, the solution at those times and why the
+    integration stopped: "time", "steady_state", "until" or "timeout".
+    The times are the ones in `t` up to where the integration stopped, plus
+    that final time if it isn't in `t`. The solution is a (time x species)
+    array, or a (batch x time x species) array when `v0` is a batch.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown integration method '{method}'. Use one "
+                         f"of {', '.join(map(repr, METHODS))}.")
+
+    start = time.perf_counter()
+    v0 = np.asarray(v0, dtype=float)
+    shape = v0.shape
+
+    def rhs(t, v):
+        return stoichiometry.rhs(v.reshape(shape)).ravel()
+
+    options = {}
+    if method in IMPLICIT_METHODS:
+        if method == "LSODA":
+            def jac(t, v):
+                return stoichiometry.jacobian(v.reshape(shape)).toarray()
+        else:
+            def jac(t, v):
+                return stoichiometry.jacobian(v.reshape(shape))
+        options["jac"] = jac
+
+    def steady(v):
+        deriv = stoichiometry.rhs(v.reshape(shape))
+        deriv[..., stoichiometry.inert] = 0
+        return np.abs(deriv).max(initial=0) < steady_state
+
+    times, states = [t[0]], [v0.ravel()]
+    reason = "time"
+    n = 1
+
+    if len(t) > 1 and t[-1] > t[0]:
+        # scipy.integrate takes longer to import than the rest of crn
+        import scipy.integrate
+
+        solver = getattr(scipy.integrate, method)(
+            rhs, t[0], v0.ravel(), t[-1], rtol=rtol, atol=atol, **options)
+
+        while solver.status == "running":
+            solver.step()
+            if solver.status == "failed":
+                raise RuntimeError("integration failed at time "
+                                   f"{solver.t}.")
+            if stats is not None:
+                stats.step(solver.t, solver.t - solver.t_old)
+                recording = time.perf_counter()
+
+            # report the requested times covered by this step
+            m = np.searchsorted(t, solver.t, side="right")
+            if m > n:
+                interpolate = solver.dense_output()
+                times.extend(t[n:m])
+                states.extend(interpolate(t[n:m]).T)
+                n = m
+
+            if stats is not None:
+                stats.timings["record"] += time.perf_counter() - recording
+
+            if steady_state is not None and steady(solver.y):
+                reason = "steady_state"
+            elif until is not None and until(solver.t,
+                                             solver.y.reshape(shape)):
+                reason = "until"
+            elif (timeout is not None
+                    and time.perf_counter() - start > timeout):
+                reason = "timeout"
+            else:
+                continue
+
+            if times[-1] != solver.t:
+                times.append(solver.t)
+                states.append(solver.y.copy())
+            break
+
+        if stats is not None:
+            stats.rhs_evaluations = solver.nfev
+            stats.jacobian_evaluations = solver.njev
+            stats.lu_decompositions = solver.nlu
+
+    times = np.array(times)
+    # time x (batch * species) -> (batch x) time x species
+    states = np.array(states).reshape((len(times),) + shape)
+    return times, np.moveaxis(states, 0, -2), reason
+
+def integrate_chunk(args):
+    """
+    The solution of `integrate` with its arguments in a tuple, for process
+    pools.
+    """
+    return integrate(*args)[1]
+
+def final_states(stoichiometry, v0, t, stacked=False, steady_state=None):
+    """
+    Integrates every row of the (batch x species) array `v0` up to time `t`,
+    or until it reaches a steady state, and returns the (batch x species)
+    array of final concentrations. With `stacked` the rows are integrated
+    together as one system with "BDF", otherwise one at a time with
+    "LSODA", like `CRN.simulate`.
+    """
+    t = np.array([0, t], dtype=float)
+    if stacked:
+        return integrate(stoichiometry, v0, t, method="BDF",
+                         steady_state=steady_state)[1][:, -1]
+    return np.array([integrate(stoichiometry, row, t,
+                               steady_state=steady_state)[1][-1]
+                     for row in v0])
@@ -0,0 +1,61 @@
+import re
+
+# one term of a side of a reaction: an optional coefficient, then a name
+TERM = re.compile(r"\s*(\d*)\s*\*?\s*([A-Za-z_][A-Za-z0-9_]*)\s*$")
+
+def parse_reactions(text):
+    """
+    Parses reactions written one per line as
+
+        A + 2B -> C @ 2.5
+
+    into arrays for `CRN.from_arrays`. A coefficient can also be written
+    as "2 B" or "2*B", "0" stands for no species, and the rate constant
+    defaults to 1 when "@ k" is left out. Blank lines and everything after
+    a "#" are ignored.
+
+    Returns the species names in order of first appearance, the (reaction,
+    species, coefficient) triples of the reactants and of the products,
+    and the rate constants.
+    """
+    column = {}
+    reactants, products, rates = ([], [], []), ([], [], []), []
+
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+
+        rxn, _, rate = line.partition("@")
+        lhs, arrow, rhs = rxn.partition("->")
+        if not arrow:
+            raise ValueError(f"parse_reactions: line {lineno}: expected "
+                             f"'->' in reaction '{line}'.")
+
+        try:
+            rates.append(float(rate) if rate.strip() else 1.0)
+        except ValueError:
+            raise ValueError(f"parse_reactions: line {lineno}: invalid rate "
+                             f"constant '{rate.strip()}'.") from None
+
+        j = len(rates) - 1
+        for side, triples in ((lhs, reactants), (rhs, products)):
+            if side.strip() == "0":
+                continue
+            for term in side.split("+"):
+                name = term.strip()
+                coeff = None
+                # most terms are a bare name, which needs no regex
+                if not name.isidentifier():
+                    match = TERM.match(term)
+                    if match is None:
+                        raise ValueError(f"parse_reactions: line {lineno}: "
+                                         f"invalid term '{name}'.")
+                    coeff, name = match.groups()
+                if name not in column:
+                    column[name] = len(column)
+                triples[0].append(j)
+                triples[1].append(column[name])
+                triples[2].append(int(coeff) if coeff else 1)
+
+    return list(column), reactants, products, rates
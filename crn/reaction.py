@@ -1,10 +1,10 @@
 import re
+import weakref
 
 from functools import reduce
 from itertools import product
 from operator import mul
 from string import Formatter
-from sympy import Symbol
 
 class Reaction:
     """
@@ -27,6 +27,9 @@ class Reaction:
         coeff: float
             The rate constant of the reaction
     """
+    __slots__ = ("reactants", "products", "coeff", "is_schema",
+                 "schema_reactants")
+
     def __init__(self, reactants, products, k=1):
         if reactants == 0:
             reactants = Species("nothing")
@@ -101,44 +104,57 @@ class Reaction:
         """
         rxns = []
         for possible_sps in product(state, repeat=len(self.schema_reactants)):
-            reactants = Expression({})
-            products = Expression({})
-            groups = {}
+            matches = []
             for sp, schema_r in zip(possible_sps, self.schema_reactants):
                 match = schema_r.match(sp)
                 if match is None:
                     break
-                # TODO: debug label. remove this check when not debugging
-                for key, val in match.groupdict().items():
-                    if key in groups:
-                        raise RuntimeError(
-                                "Duplicate group name used in the same "
-                                "reaction schema.")
-                groups.update(match.groupdict())
-                reactants += sp * self.reactants.species[schema_r]
+                matches.append(match.groupdict())
 
             # Enters only if 'break' wasn't reach in the above loop
             else:
-                for r, c in self.reactants.species.items():
-                    if not r.is_schema:
-                        reactants += r * c
-
-                for p, c in self.products.species.items():
-                    if p.is_schema:
-                        p = Species(p.name.format(**groups))
-                    products += p * c
-
-                rxns.append((reactants >> products).k(self.coeff))
+                rxns.append(self.instantiate(possible_sps, matches))
         return rxns
 
+    def instantiate(self, species, groups):
+        """
+        Returns the non-schema reaction obtained by substituting `species`,
+        one per entry of `self.schema_reactants`, for the schema reactants.
+        `groups` holds the named groups captured when matching each species
+        against its schema reactant.
+        """
+        reactants = {}
+        products = {}
+        all_groups = {}
+        for sp, schema_r, match in zip(species, self.schema_reactants,
+                                       groups):
+            # TODO: debug label. remove this check when not debugging
+            for key in match:
+                if key in all_groups:
+                    raise RuntimeError(
+                            "Duplicate group name used in the same "
+                            "reaction schema.")
+            all_groups.update(match)
+            reactants[sp] = (reactants.get(sp, 0) +
+                             self.reactants.species[schema_r])
+
+        for r, c in self.reactants.species.items():
+            if not r.is_schema:
+                reactants[r] = reactants.get(r, 0) + c
+
+        for p, c in self.products.species.items():
+            if p.is_schema:
+                p = Species(p.name.format(**all_groups))
+            products[p] = products.get(p, 0) + c
+
+        return Reaction(Expression(reactants), Expression(products),
+                        self.coeff)
+
     def get_species(self):
         """
         Returns the set of species present in the products and reactants.
         """
-        return {
-            *self.reactants.get_species(),
-            *self.products.get_species()
-        }
+        return {*self.reactants.species, *self.products.species}
 
     def net_production(self, species):
         """
@@ -158,6 +174,8 @@ class Reaction:
         of the discrete/stochastic reaction rate of this reaction. Essentially
         the propensity not including the rate constant.
         """
+        from sympy import Symbol
+
         def flux_part(i):
             s, c = i
             return reduce(mul, (Symbol(s.name) - i for i in range(c)))
@@ -180,6 +198,8 @@ class Reaction:
         Returns a symbolic representation of the reaction rate of this
         reaction.
         """
+        from sympy import Symbol
+
         def flux_part(i):
             s, c = i
             return Symbol(s.name) ** c
@@ -199,6 +219,8 @@ class Expression:
         species: Dict[str, int]
             represents species (string names) and their coefficients (ints)
             all added together.
+        is_schema: Optional[bool]
+            whether any of the species is a schema, if already known.
 
     properties:
         species: Dict[str, int]
@@ -206,9 +228,36 @@ class Expression:
             all added together. The same as the argument passed to the
             constructor
     """
-    def __init__(self, species):
+    __slots__ = ("species", "is_schema")
+
+    def __init__(self, species, is_schema=None):
         self.species = species
-        self.is_schema = any(sp.is_schema for sp in self.species)
+        self.is_schema = (any(sp.is_schema for sp in self.species)
+                          if is_schema is None else is_schema)
+
+    @classmethod
+    def from_terms(cls, terms):
+        """
+        Returns the sum of `terms`, an iterable of Species, Expressions and
+        (Species, coefficient) pairs. Chaining `+` copies the sum so far for
+        every term, which is quadratic in the number of terms; this builds
+        the sum in one pass.
+
+            x = Expression.from_terms(species(" ".join(names)))
+            y = Expression.from_terms([(a, 2), (b, 1)])
+        """
+        species = {}
+        for term in terms:
+            if type(term) is Species:
+                species[term] = species.get(term, 0) + 1
+            elif type(term) is Expression:
+                for s, c in term.species.items():
+                    species[s] = species.get(s, 0) + c
+            else:
+                s, c = term
+                species[s] = species.get(s, 0) + c
+
+        return cls(species)
 
     def __add__(self, other):
         if type(other) is Expression:
@@ -255,26 +304,85 @@ class Expression:
 
 
 class Species:
-    def __init__(self, name, is_schema=False, schema_groups=None):
+    """
+    A chemical species, or with `is_schema`, a schema: a pattern of species
+    names with named groups, created with `schemas`.
+
+    Non-schema species are interned: constructing a Species with the name
+    of one that already exists returns that same object, so a network with
+    many references to a species holds it once. The interned species are
+    only referenced weakly, so they are freed with the last network or
+    expression using them. Species are immutable apart from the compiled
+    pattern of a schema, so their hash never changes and is only computed
+    once.
+
+    args:
+        name: str
+            The name of the species, or the pattern of the schema.
+        is_schema: bool
+            Whether this is a schema.
+        schema_groups: Optional[Dict[str, str]]
+            For schemas, the regular expression of every named group.
+    """
+    __slots__ = ("name", "is_schema", "schema_groups", "schema",
+                 "regex_schema", "_hash", "__weakref__")
+
+    # the attributes the hash and equality depend on
+    _frozen = frozenset(("name", "is_schema", "schema_groups", "_hash"))
+    # every non-schema species still in use, by name
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, name, is_schema=False, schema_groups=None):
+        if not is_schema:
+            sp = cls._interned.get(name)
+            if sp is not None:
+                if schema_groups is not None:
+                    raise ValueError(
+                            "Species constructor passed 'schema_groups' but "
+                            "'is_schema' is False.")
+                return sp
+
         if name == "time":
             raise ValueError(
                 "Failed to create Species 'time' because it is a reserved "
                 "Species name. Please choose another name for this Species.")
 
-        self.name = name
-        self.is_schema = is_schema
+        self = object.__new__(cls)
+        init = object.__setattr__
+        init(self, "name", name)
+        init(self, "is_schema", is_schema)
 
-        if self.is_schema:
+        if is_schema:
             if schema_groups is None:
                 schema_groups = {}
 
-            self.schema_groups = schema_groups
-            self.schema = name
-            self.regex_schema = None
+            init(self, "schema_groups", schema_groups)
+            init(self, "schema", name)
+            init(self, "regex_schema", None)
+            init(self, "_hash", hash((name, True,
+                                      tuple(sorted(schema_groups.items())))))
         elif schema_groups is not None:
             raise ValueError(
                     "Species constructor passed 'schema_groups' but "
                     "'is_schema' is False.")
+        else:
+            cls._interned[name] = self
+
+        return self
+
+    def __setattr__(self, attr, value):
+        if attr in Species._frozen:
+            raise AttributeError(f"Species.{attr} can't be changed.")
+        object.__setattr__(self, attr, value)
+
+    def __reduce__(self):
+        if not self.is_schema:
+            return (Species, (self.name,))
+        return (Species, (self.name, True, self.schema_groups),
+                (self.schema, self.regex_schema))
+
+    def __setstate__(self, state):
+        self.schema, self.regex_schema = state
 
     def reactify(self):
         if not self.is_schema:
@@ -378,6 +486,9 @@ class Species:
         return self.name
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if type(other) is not Species:
             return NotImplemented
 
@@ -387,7 +498,7 @@ class Species:
         elif not self.is_schema and not other.is_schema:
             return self.name == other.name
         else:
-            False
+            return False
 
     def __lt__(self, other):
         if type(other) is Species:
@@ -405,9 +516,10 @@ class Species:
         return NotImplemented
 
     def __hash__(self):
-        return hash((self.name, self.is_schema,
-            tuple(sorted(self.schema_groups.items()))
-                if self.is_schema else None))
+        # str caches its hash, so only schemas need to store theirs
+        if self.is_schema:
+            return self._hash
+        return hash(self.name)
 
     __req__ = __eq__
 
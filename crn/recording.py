@@ -0,0 +1,354 @@
+import numpy as np
+import os
+
+from crn.storage import TrajectoryWriter, lookup
+from crn.utils import GrowableArray
+from scipy import sparse
+
+class TrajectoryBuffer:
+    """
+    Records the states a stochastic simulation goes through in memory. The
+    simulators in `crn.stochastic` append to one of these by default; a
+    `TrajectoryWriter` can be passed instead to stream the states to disk.
+
+    Only the initial state and, for every later state, the entries that
+    changed are kept, so memory grows with the number of changes rather
+    than with events x species. Dense series and states are built on
+    demand, and `resample` evaluates the piecewise constant trajectory on
+    any time grid without building them.
+
+    args:
+        n_species: int
+            The length of every state.
+        species: Optional[Dict[Species, int]]
+            The species that can be looked up with `__getitem__`, mapped to
+            their index in the states.
+    """
+    def __init__(self, n_species, species=None):
+        self.n_species = n_species
+        self.column = dict(species) if species is not None else {}
+
+        self._times = GrowableArray(float)
+        # the changes of row `i` are _columns/_values[_indptr[i]:_indptr[i + 1]]
+        self._indptr = GrowableArray(np.int64)
+        self._columns = GrowableArray(np.intp)
+        self._values = GrowableArray(np.int64)
+        self._initial = np.zeros(n_species, dtype=np.int64)
+        self._last = None
+        self._keys = None
+        self._series = {}
+
+        self._indptr.append(0)
+
+    def __len__(self):
+        return len(self.column)
+
+    def __iter__(self):
+        return iter(self.column)
+
+    def __contains__(self, sp):
+        return sp in self.column
+
+    def __getitem__(self, sp):
+        if sp not in self._series:
+            self._series[sp] = self.series([self.column[sp]])[:, 0]
+        return self._series[sp]
+
+    def items(self):
+        return ((sp, self[sp]) for sp in self.column)
+
+    def append(self, time, state, changed=None):
+        """
+        Records the state `state` at time `time`. `changed`, if given, holds
+        the indices of every entry that may differ from the previous state;
+        otherwise they are found by comparing the two.
+        """
+        if self._last is None:
+            self._initial[:] = state
+            self._last = self._initial.copy()
+            changed = np.empty(0, dtype=np.intp)
+        elif changed is None:
+            changed = np.flatnonzero(state != self._last)
+
+        values = state[changed]
+        self._last[changed] = values
+        self._columns.extend(changed)
+        self._values.extend(values)
+        self._times.append(time)
+        self._indptr.append(len(self._columns))
+        self._keys = None
+        self._series.clear()
+
+    @property
+    def times(self):
+        return self._times.values
+
+    @property
+    def states(self):
+        """
+        The dense (time x species) array of recorded states.
+        """
+        return self.series(np.arange(self.n_species))
+
+    def series(self, columns):
+        """
+        Returns the dense (time x columns) array of the recorded values of
+        the entries `columns` of the states.
+        """
+        return self._at(np.arange(len(self._times)), columns)
+
+    def resample(self, grid, columns=None):
+        """
+        Returns the (grid x columns) array of the states at the times in
+        `grid`, taking the trajectory to be constant between events. Times
+        before the first recorded state get the initial state. `columns`
+        defaults to every index of the states.
+        """
+        rows = np.searchsorted(self._times.values, grid, side="right") - 1
+        if columns is None:
+            columns = np.arange(self.n_species)
+        return self._at(np.maximum(rows, 0), columns)
+
+    def _at(self, rows, columns):
+        """
+        The (rows x columns) array of recorded values: for every column,
+        the value it was last set to at or before every row.
+        """
+        n_rows = len(self._times)
+        if self._keys is None:
+            # one sorted key per change, ordered by column and then row
+            changed_rows = np.repeat(np.arange(n_rows),
+                                     np.diff(self._indptr.values))
+            keys = self._columns.values * n_rows + changed_rows
+            order = np.argsort(keys, kind="stable")
+            self._keys = keys[order], self._values.values[order]
+
+        keys, values = self._keys
+        return lookup(keys, values, self._initial, n_rows, rows,
+                      np.asarray(columns, dtype=np.intp))
+
+
+class EventLog:
+    """
+    Append-only record of a stochastic simulation: the initial counts, and
+    for every event its time and the id of the reaction that fired. The
+    change in counts a reaction causes is stored once per reaction rather
+    than once per event, so recording an event costs O(1) no matter how
+    many species the simulation has seen.
+
+    The count series of a species is only built when it is looked up, and
+    cached from then on. Every series has one entry per entry of `times`.
+
+    With `spill`, the events are written out to that directory every
+    `chunksize` events instead of being kept in memory, and `write` turns
+    them into a trajectory on disk afterwards.
+
+    args:
+        initial: Dict[Species, int]
+            The initial count of every species present.
+        spill: Optional[str]
+            The directory to write the events to.
+        chunksize: int
+            The number of events kept in memory between writes to `spill`.
+
+    attributes:
+        species: List[Species]
+            Every species seen so far, in the order they appeared.
+        reactions: List[Reaction]
+            Every reaction that fired so far, indexed by reaction id.
+        stop_reason: Optional[str]
+            Why the simulation stopped, set by the simulator.
+    """
+    def __init__(self, initial, spill=None, chunksize=1 << 16):
+        self.species = []
+        self.column = {}
+        self.reactions = []
+        self.reaction_id = {}
+        self.stop_reason = None
+
+        self._initial = GrowableArray(np.int64)
+        # the time and reaction id of every event not spilled yet
+        self._times = GrowableArray(float)
+        self._events = GrowableArray(np.int64)
+        # changes of reaction `r` are _delta_*[_indptr[r]:_indptr[r + 1]]
+        self._indptr = GrowableArray(np.int64)
+        self._delta_species = GrowableArray(np.int64)
+        self._delta_change = GrowableArray(np.int64)
+        self._series = {}
+        self._spill = spill
+        self._chunksize = chunksize
+
+        if spill is not None:
+            os.makedirs(spill, exist_ok=True)
+            for name in self._spill_files():
+                open(name, "wb").close()
+
+        self._indptr.append(0)
+        for sp, count in initial.items():
+            self._add_species(sp, count)
+
+    def __len__(self):
+        return len(self.species)
+
+    def __iter__(self):
+        return iter(self.species)
+
+    def __contains__(self, sp):
+        return sp in self.column
+
+    def __getitem__(self, sp):
+        if sp not in self._series:
+            self._series[sp] = self._materialize(self.column[sp])
+        return self._series[sp]
+
+    def items(self):
+        return ((sp, self[sp]) for sp in self.species)
+
+    @property
+    def times(self):
+        """
+        The initial time followed by the time of every event.
+        """
+        return np.concatenate([[0.0], *(t for t, _ in self._chunks())])
+
+    @property
+    def events(self):
+        """
+        The id of the reaction that fired at every event.
+        """
+        return np.concatenate([np.empty(0, dtype=np.int64),
+                               *(e for _, e in self._chunks())])
+
+    @property
+    def fired(self):
+        """
+        The reaction that fired at every event, in order.
+        """
+        reactions = self.reactions
+        return [reactions[r] for r in self.events.tolist()]
+
+    def record(self, time, rxn):
+        """
+        Records that `rxn` fired at `time`.
+        """
+        r = self.reaction_id.get(rxn)
+        if r is None:
+            r = self._add_reaction(rxn)
+        self._times.append(time)
+        self._events.append(r)
+        self._series.clear()
+
+        if self._spill is not None and len(self._events) >= self._chunksize:
+            self._flush()
+
+    def write(self, path, chunksize=None):
+        """
+        Writes the count series of every species to a `TrajectoryWriter` at
+        `path`, replaying the events a chunk at a time, and returns the
+        `Trajectory` written. Removes the events spilled to `path`, if any.
+        """
+        n = len(self.species)
+        delta = sparse.csr_matrix(
+            (self._delta_change.values, self._delta_species.values,
+             self._indptr.values), shape=(len(self.reactions), n))
+
+        writer = TrajectoryWriter(path, self.species, chunksize=chunksize)
+        counts = self._initial.values.copy()
+        writer.append(0.0, counts)
+        rows = writer.chunksize
+        for times, events in self._chunks():
+            for lo in range(0, len(events), rows):
+                block = delta[events[lo:lo + rows]]
+                columns = block.indices
+
+                # the count after every change is the count before the
+                # block plus the changes to that species up to it, a
+                # running sum over the changes grouped by species
+                order = np.argsort(columns, kind="stable")
+                changes = block.data[order]
+                starts = np.flatnonzero(np.diff(columns[order], prepend=-1))
+                ends = np.append(starts[1:], len(order))
+                totals = np.cumsum(changes)
+                totals -= np.repeat(totals[starts] - changes[starts],
+                                    ends - starts)
+
+                values = np.empty_like(totals)
+                values[order] = totals + counts[columns[order]]
+                counts[columns[order][ends - 1]] = values[order][ends - 1]
+                writer.extend(times[lo:lo + rows], np.diff(block.indptr),
+                              columns, values)
+
+        if self._spill is not None and \
+                os.path.abspath(self._spill) == os.path.abspath(path):
+            for name in self._spill_files():
+                os.remove(name)
+
+        return writer.close(self.stop_reason)
+
+    def _spill_files(self):
+        return (os.path.join(self._spill, "events.time.bin"),
+                os.path.join(self._spill, "events.reaction.bin"))
+
+    def _flush(self):
+        for name, array in zip(self._spill_files(),
+                               (self._times, self._events)):
+            with open(name, "ab") as f:
+                array.values.tofile(f)
+            array.size = 0
+
+    def _chunks(self):
+        """
+        Yields the (times, reaction ids) of the events in order, a chunk at
+        a time: first the ones spilled to disk, then the ones in memory.
+        """
+        if self._spill is not None:
+            time_file, event_file = self._spill_files()
+            size = os.path.getsize(event_file) // 8
+            if size:
+                times = np.memmap(time_file, dtype=float, mode="r",
+                                  shape=(size,))
+                events = np.memmap(event_file, dtype=np.int64, mode="r",
+                                   shape=(size,))
+                for lo in range(0, size, self._chunksize):
+                    yield (times[lo:lo + self._chunksize],
+                           events[lo:lo + self._chunksize])
+
+        yield self._times.values, self._events.values
+
+    def _add_species(self, sp, count=0):
+        self.column[sp] = len(self.species)
+        self.species.append(sp)
+        self._initial.append(count)
+
+    def _add_reaction(self, rxn):
+        r = self.reaction_id[rxn] = len(self.reactions)
+        self.reactions.append(rxn)
+
+        delta = dict(rxn.products.species)
+        for sp, c in rxn.reactants.species.items():
+            delta[sp] = delta.get(sp, 0) - c
+
+        for sp, c in delta.items():
+            if c == 0:
+                continue
+            if sp not in self.column:
+                self._add_species(sp)
+            self._delta_species.append(self.column[sp])
+            self._delta_change.append(c)
+        self._indptr.append(len(self._delta_species))
+        return r
+
+    def _materialize(self, column):
+        indptr = self._indptr.values
+        rows = np.repeat(np.arange(len(self.reactions)), np.diff(indptr))
+        mask = self._delta_species.values == column
+
+        change = np.zeros(len(self.reactions), dtype=np.int64)
+        change[rows[mask]] = self._delta_change.values[mask]
+
+        events = self.events
+        series = np.empty(len(events) + 1, dtype=np.int64)
+        series[0] = self._initial.values[column]
+        np.cumsum(change[events], out=series[1:])
+        series[1:] += series[0]
+        return series
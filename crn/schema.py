@@ -0,0 +1,340 @@
+import math
+import re
+
+from crn.recording import EventLog
+from itertools import product
+
+# the first character of a regular expression that is not a literal
+METACHARACTER = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+def literal_prefix(regex):
+    """
+    Returns a string every name matched by the compiled `regex`, anchored
+    with "^", starts with.
+    """
+    pattern = regex.pattern[1:]
+    if "|" in pattern:
+        return ""
+    match = METACHARACTER.search(pattern)
+    if match is None:
+        return pattern
+    # a quantifier can make the character before it optional
+    end = match.start()
+    return pattern[:end - 1 if pattern[end] in "*+?{" else end]
+
+class SchemaIndex:
+    """
+    Index from every schema reactant of a CRN's schema reactions to the
+    species currently present that match it, together with every
+    non-schema reaction instantiated from those matches.
+
+    The index is updated incrementally: `add` is called when a species'
+    count goes from zero to positive and `remove` when it drops back to
+    zero, and only the instantiations involving that species are created or
+    dropped, instead of matching every tuple of present species on every
+    step like `Reaction.possible_reactions` does. A new species is only
+    matched against the schema reactants whose literal prefix it starts
+    with, and a species that disappears only visits its own matches.
+
+    args:
+        reactions: Iterable[Reaction]
+            The reactions of the CRN. Only the schema reactions are indexed.
+
+    attributes:
+        reactions: Dict[Tuple[int, Tuple[Species]], Reaction]
+            The instantiated reactions, keyed by the index of the schema
+            reaction and the species substituted for its schema reactants.
+    """
+    def __init__(self, reactions):
+        self.schemas = [rxn for rxn in reactions if rxn.is_schema]
+        # matches[r][p] maps every present species matching the p-th schema
+        # reactant of schema reaction r to the groups the match captured
+        self.matches = [[{} for _ in rxn.schema_reactants]
+                        for rxn in self.schemas]
+        self.reactions = {}
+        self._keys_of = {}
+        # the (r, p) of every schema reactant `sp` matched
+        self._matched = {}
+
+        # (r, p) of every schema reactant, by the length of its literal
+        # prefix and then by the prefix
+        self._prefixes = {}
+        for r, rxn in enumerate(self.schemas):
+            for p, schema_r in enumerate(rxn.schema_reactants):
+                prefix = literal_prefix(schema_r.regex_schema)
+                self._prefixes.setdefault(len(prefix), {}) \
+                    .setdefault(prefix, []).append((r, p))
+
+        # schema reactions without schema reactants have one instantiation
+        for r, rxn in enumerate(self.schemas):
+            if not rxn.schema_reactants:
+                self._instantiate(r, ())
+
+    def __iter__(self):
+        return iter(self.reactions.values())
+
+    def __len__(self):
+        return len(self.reactions)
+
+    def add(self, sp):
+        """
+        Registers the newly present species `sp`. Returns the list of
+        reactions instantiated because of it.
+        """
+        candidates = sorted(
+            rp for length, by_prefix in self._prefixes.items()
+            for rp in by_prefix.get(sp.name[:length], ()))
+        matched = {}
+        for r, p in candidates:
+            match = self.schemas[r].schema_reactants[p].match(sp)
+            if match is not None:
+                self.matches[r][p][sp] = match.groupdict()
+                self._matched.setdefault(sp, []).append((r, p))
+                matched.setdefault(r, []).append(p)
+
+        new = []
+        for r, positions in matched.items():
+            # every new tuple has `sp` in at least one matched position
+            for p in positions:
+                choices = list(self.matches[r])
+                choices[p] = {sp: None}
+                for species in product(*choices):
+                    if (r, species) not in self.reactions:
+                        new.append(self._instantiate(r, species))
+
+        return new
+
+    def remove(self, sp):
+        """
+        Unregisters the species `sp`, which is no longer present. Returns
+        the list of reactions dropped because of it.
+        """
+        for r, p in self._matched.pop(sp, ()):
+            del self.matches[r][p][sp]
+
+        dropped = []
+        for key in self._keys_of.pop(sp, ()):
+            dropped.append(self.reactions.pop(key))
+            for other in key[1]:
+                if other != sp:
+                    self._keys_of[other].discard(key)
+        return dropped
+
+    def _instantiate(self, r, species):
+        groups = [self.matches[r][p][sp] for p, sp in enumerate(species)]
+        rxn = self.schemas[r].instantiate(species, groups)
+        self.reactions[r, species] = rxn
+        for sp in species:
+            self._keys_of.setdefault(sp, set()).add((r, species))
+        return rxn
+
+
+class SumTree:
+    """
+    A Fenwick tree over nonnegative weights, one per slot, that supports
+    changing a weight and picking a slot with probability proportional to
+    its weight in O(log n). The number of slots grows as needed.
+
+    args:
+        capacity: int
+            The number of slots allocated up front.
+    """
+    def __init__(self, capacity=64):
+        self.weights = [0.0] * capacity
+        self.tree = [0.0] * (capacity + 1)
+        self.total = 0.0
+        # number of slots with positive weight, kept exactly so an empty
+        # tree is never mistaken for one with some rounding error left
+        self.positive = 0
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __getitem__(self, i):
+        return self.weights[i]
+
+    def __setitem__(self, i, weight):
+        if i >= len(self.weights):
+            self._grow(i + 1)
+
+        weight = float(weight)
+        old = self.weights[i]
+        self.weights[i] = weight
+        self.positive += (weight > 0) - (old > 0)
+        delta = weight - old
+        self.total += delta
+
+        tree, n = self.tree, len(self.weights)
+        i += 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def find(self, u):
+        """
+        Returns the slot `i` whose cumulative weight range
+        [sum(weights[:i]), sum(weights[:i + 1])) contains `u`.
+        """
+        tree, n = self.tree, len(self.weights)
+        pos = 0
+        rest = u
+        mask = 1 << (n.bit_length() - 1)
+        while mask:
+            nxt = pos + mask
+            if nxt <= n and tree[nxt] <= rest:
+                rest -= tree[nxt]
+                pos = nxt
+            mask >>= 1
+
+        if pos < n and self.weights[pos] > 0:
+            return pos
+
+        # Rounding landed on an empty slot. This is rare, so fall back to
+        # an exact linear search and clean up the tree while at it.
+        self.rebuild()
+        for i, w in enumerate(self.weights):
+            if w > 0:
+                pos = i
+                if u < w:
+                    break
+                u -= w
+        return pos
+
+    def sample(self, rng):
+        """
+        Returns a slot picked with probability proportional to its weight.
+        """
+        return self.find(rng.random() * self.total)
+
+    def rebuild(self):
+        """
+        Recomputes the tree from the weights, discarding rounding errors.
+        """
+        n = len(self.weights)
+        tree = [0.0] + list(self.weights)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = math.fsum(self.weights)
+
+    def _grow(self, n):
+        self.weights += [0.0] * (max(n, 2 * len(self.weights)) - len(self))
+        self.rebuild()
+
+
+def schema_simulation(system, state, time, steps, rng, spill=None,
+                      stats=None):
+    """
+    Gillespie's direct method for CRNs with reaction schemas.
+
+    Propensities are cached per reaction in a `SumTree` and only
+    recomputed for the reactions whose reactants changed, and the reactions
+    instantiated from the schemas are maintained by a `SchemaIndex`, so a
+    step costs about O(log n) in the number of possible reactions.
+
+    args:
+        system: Iterable[Reaction]
+            The reactions of the CRN.
+        state: Dict[Species, int]
+            The initial counts of the species present. Updated in place.
+        time: float
+            The time to simulate up to.
+        steps: float
+            The number of reactions to simulate.
+        rng: np.random.Generator
+            The source of randomness.
+        spill: Optional[str]
+            A directory to spill the events to, as in `EventLog`.
+        stats: Optional[crn.instrument.Stats]
+            If given, every event is counted in it, and the time spent
+            recording the events.
+
+    Returns the `EventLog` of the simulation, with its `stop_reason` set to
+    "time", "steps" or "steady_state" if no reaction could fire. An event
+    is recorded at the time the reaction fires, and a reaction that would
+    fire after `time` is not simulated.
+    """
+    index = SchemaIndex(system)
+    tree = SumTree()
+    slots = {}
+    reactions = []
+    free = []
+    dependents = {}
+
+    def insert(rxn):
+        if free:
+            slot = free.pop()
+            reactions[slot] = rxn
+        else:
+            slot = len(reactions)
+            reactions.append(rxn)
+        slots[rxn] = slot
+        for sp in rxn.reactants.species:
+            dependents.setdefault(sp, set()).add(rxn)
+        tree[slot] = rxn.propensity(state)
+
+    def delete(rxn):
+        slot = slots.pop(rxn)
+        tree[slot] = 0.0
+        reactions[slot] = None
+        free.append(slot)
+        for sp in rxn.reactants.species:
+            dependents[sp].discard(rxn)
+
+    for rxn in system:
+        if not rxn.is_schema:
+            insert(rxn)
+    for sp in state:
+        for rxn in index.add(sp):
+            insert(rxn)
+
+    log = EventLog(state, spill=spill)
+    record = log.record if stats is None else stats.timed("record",
+                                                          log.record)
+    curr_time = curr_steps = 0
+    log.stop_reason = "steps"
+
+    while curr_steps < steps:
+        if not tree.positive:
+            print("simulation ended before reaching 'time' or 'steps'")
+            log.stop_reason = "steady_state"
+            break
+
+        wait = rng.exponential(1 / tree.total)
+        curr_time += wait
+        if curr_time >= time:
+            log.stop_reason = "time"
+            break
+
+        rxn = reactions[tree.sample(rng)]
+        record(curr_time, rxn)
+        if stats is not None:
+            stats.step(curr_time, wait)
+
+        # Register chosen reaction effects
+        changed = []
+        for r, c in rxn.reactants.species.items():
+            state[r] -= c
+            changed.append(r)
+            if state[r] == 0:
+                del state[r]
+                for dropped in index.remove(r):
+                    delete(dropped)
+
+        for p, c in rxn.products.species.items():
+            if p not in state:
+                state[p] = 0
+                for new in index.add(p):
+                    insert(new)
+            state[p] += c
+            changed.append(p)
+
+        for sp in changed:
+            for dependent in dependents.get(sp, ()):
+                tree[slots[dependent]] = dependent.propensity(state)
+
+        curr_steps += 1
+
+    return log
@@ -1,6 +1,10 @@
-import matplotlib.pyplot as plt
+import json
+import numpy as np
 
 from crn import Species
+from crn.ensemble import resample
+from crn.recording import EventLog, TrajectoryBuffer
+from crn.storage import Trajectory, dump_species, load_species
 
 class Simulation:
     """
@@ -8,35 +12,252 @@ class Simulation:
     of every species in the CRN throughout the simulation. Allows for quick
     plotting and extraction of simulation data.
 
+    The series are the columns of one (time x species) array, `data`, and
+    looking up a species returns a view of its column. Species can be
+    looked up by Species or by name, one at a time or several at once:
+
+        sim[x]             # the series of x
+        sim["X"]           # the same
+        sim[[x, "Y"]]      # a (time x 2) array
+
     This class probably won't be constructed by a user, thus it's
     implementation is more internal.
 
     args:
-        sim: Dict[crn.Species, np.ndarray]
-            A dictionary of species name to concentration time series.
-            This dictionary also contains other fields such as "time" and
-            "nothing" which are used for plotting data. This dictionary
-            makes no guarantees that these are the only things it will
-            contain, it may have new fields that are added if they are
-            needed.
+        sim: Union[Dict[crn.Species, np.ndarray], EventLog,
+                   TrajectoryBuffer, Trajectory]
+            A dictionary of species to concentration time series, plus
+            "time" and optionally "reactions", whose series are copied
+            into `data`. An `EventLog`, `TrajectoryBuffer` or `Trajectory`
+            can be passed instead, in which case the series are read from
+            it as they are looked up and `data` is only built if it is
+            asked for.
+        stochastic: bool
+            Whether the series are molecule counts rather than
+            concentrations.
+        stop_reason: Optional[str]
+            Why the simulation stopped, e.g. "time" if it ran for as long
+            as it was asked to or "steady_state" if it stopped early.
+
+    attributes:
+        time: np.ndarray
+            The times of the samples in every series.
+        species: List[Species]
+            The species simulated, in column order.
+        stop_reason: Optional[str]
+            Why the simulation stopped, if the simulator reports it.
+        stop_time: float
+            The time the simulation stopped at.
+        sensitivities: Optional[np.ndarray]
+            For `CRN.simulate` with `sensitivities`, the (time x species x
+            parameters) derivatives of the series with respect to the rate
+            constants of `parameters`.
+        parameters: Optional[List[Reaction]]
+            The reactions `sensitivities` is taken with respect to.
+        stats: Optional[crn.instrument.Stats]
+            The counters and timings of the simulation, if it was run with
+            `stats=True` or a `callback`.
     """
-    def __init__(self, sim, stochastic=False):
-        self.sim = sim
+    def __init__(self, sim, stochastic=False, stop_reason=None):
         self.stochastic = stochastic
-        self.time = sim["time"]
-        self.reactions = sim.get("reactions", None)
+        self.stop_reason = stop_reason
+        self.reactions = None
+        self.sensitivities = None
+        self.parameters = None
+        self.stats = None
+        self._data = None
+        self._source = None
+
+        if isinstance(sim, (EventLog, TrajectoryBuffer, Trajectory)):
+            self._source = sim
+            self.time = sim.times
+            self.species = list(sim)
+            if isinstance(sim, EventLog):
+                self.reactions = sim.fired
+        else:
+            sim = dict(sim)
+            self.time = np.asarray(sim.pop("time"))
+            self.reactions = sim.pop("reactions", None)
+            self.species = list(sim)
+            self._data = (np.column_stack(list(sim.values())) if sim
+                          else np.empty((len(self.time), 0)))
+
+        self.column = {sp: i for i, sp in enumerate(self.species)}
+        # names can't be turned back into schema species, so they are
+        # resolved through the species simulated
+        self._names = {sp.name: i for i, sp in enumerate(self.species)}
+        self.stop_time = self.time[-1] if len(self.time) else 0
+
+    @classmethod
+    def from_array(cls, time, data, species, stochastic=False,
+                   stop_reason=None):
+        """
+        Wraps the (time x species) array `data`, whose columns are the
+        series of `species`, without copying it.
+        """
+        sim = cls({"time": time}, stochastic=stochastic,
+                  stop_reason=stop_reason)
+        sim.species = list(species)
+        sim.column = {sp: i for i, sp in enumerate(sim.species)}
+        sim._names = {sp.name: i for i, sp in enumerate(sim.species)}
+        sim._data = np.asarray(data)
+
+        if sim._data.shape != (len(sim.time), len(sim.species)):
+            raise ValueError(
+                "Simulation.from_array: expected a (time x species) array "
+                f"of shape {(len(sim.time), len(sim.species))}, got "
+                f"{sim._data.shape}.")
+        return sim
 
-        del sim["time"]
-        del sim["reactions"]
+    @classmethod
+    def open(cls, path):
+        """
+        Opens the trajectory written to the directory `path` by a streaming
+        simulation, such as `CRN.stoch_simulate` with `path`. The files
+        are memory-mapped and a species is only read when it is looked up,
+        so the trajectory can be larger than memory. See `Trajectory`.
+        """
+        trajectory = Trajectory(path)
+        return cls(trajectory, stochastic=trajectory.stochastic,
+                   stop_reason=trajectory.stop_reason)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads a Simulation saved with `Simulation.save`.
+        """
+        with np.load(filename) as f:
+            stop_reason = str(f["stop_reason"]) or None
+            if f["species"].ndim == 0:
+                species = load_species(json.loads(str(f["species"])))
+            else:
+                # saved before schema species were recorded
+                species = [Species(name) for name in f["species"]]
+            return cls.from_array(f["time"], f["data"], species,
+                                  stochastic=bool(f["stochastic"]),
+                                  stop_reason=stop_reason)
+
+    def save(self, filename):
+        """
+        Saves the times and series to the `.npz` file `filename`, to be read
+        back with `Simulation.load`. The reactions fired are not saved.
+        """
+        np.savez(filename, time=self.time, data=self.data,
+                 species=json.dumps(dump_species(self.species)),
+                 stochastic=self.stochastic,
+                 stop_reason=self.stop_reason or "")
+
+    @property
+    def data(self):
+        """
+        The (time x species) array of every series, with columns ordered
+        like `species`. Built on first use when the series are read from an
+        `EventLog`, `TrajectoryBuffer` or `Trajectory`.
+        """
+        if self._data is None:
+            if isinstance(self._source, (TrajectoryBuffer, Trajectory)):
+                self._data = self._source.series(
+                    self._columns(self.species))
+            else:
+                self._data = np.column_stack(
+                    [self._source[sp] for sp in self.species]
+                    ).reshape(len(self.time), -1)
+        return self._data
+
+    def __contains__(self, s):
+        if type(s) is str:
+            return s in self._names
+        return s in self.column
+
+    def __iter__(self):
+        return iter(self.species)
+
+    def __len__(self):
+        return len(self.species)
+
+    def items(self):
+        return ((sp, self[sp]) for sp in self.species)
 
     def __getitem__(self, s):
-        if type(s) is not Species:
+        if type(s) in (list, tuple):
+            species = [self._species(sp) for sp in s]
+            if self._data is not None:
+                return self._data[:, [self.column[sp] for sp in species]]
+            if isinstance(self._source, (TrajectoryBuffer, Trajectory)):
+                return self._source.series(self._columns(species))
+            return np.column_stack([self._source[sp] for sp in species]
+                                   ).reshape(len(self.time), -1)
+
+        s = self._species(s)
+        if self._data is None:
+            return self._source[s]
+        return self._data[:, self.column[s]]
+
+    def sensitivity(self, s):
+        """
+        Returns the (time x parameters) derivatives of the series of species
+        `s` with respect to the rate constants of `self.parameters`.
+        """
+        if self.sensitivities is None:
+            raise RuntimeError(
+                "Simulation.sensitivity: no sensitivities were computed. "
+                "Pass `sensitivities` to `CRN.simulate`.")
+        return self.sensitivities[:, self.column[self._species(s)]]
+
+    def _species(self, s):
+        if type(s) is str:
+            if s not in self._names:
+                raise KeyError(f"Simulation: species {s} was not simulated.")
+            return self.species[self._names[s]]
+        elif type(s) is not Species:
             raise ValueError(
                 "Simulation.__getitem__: tried to get item of non-species. "
-                "Type of key must be Species. The type of the key "
-                f"passed was {type(s)}")
+                "Type of key must be Species, str, or a list of them. The "
+                f"type of the key passed was {type(s)}")
 
-        return self.sim[s]
+        if s not in self.column:
+            raise KeyError(f"Simulation: species {s} was not simulated.")
+        return s
+
+    def _columns(self, species):
+        # columns of `species` in the TrajectoryBuffer or Trajectory
+        column = self._source.column
+        return [column[self._species(sp)] for sp in species]
+
+    def resample(self, time):
+        """
+        Returns a new Simulation with every series sampled at the times in
+        `time`. Stochastic series are piecewise constant between events,
+        so they are sampled with a binary search on the event times;
+        concentrations are interpolated linearly.
+
+        args:
+            time: np.ndarray
+                The times to sample at, in increasing order.
+        """
+        time = np.asarray(time, dtype=float)
+        if isinstance(self._source, (TrajectoryBuffer, Trajectory)):
+            data = self._source.resample(time, self._columns(self.species))
+        elif self._data is None:
+            # one series at a time, as the EventLog builds them
+            data = np.column_stack(
+                [resample(self.time, np.asarray(self[sp]), time)
+                 for sp in self.species]).reshape(len(time), -1)
+        elif self.stochastic:
+            data = resample(self.time, self._data, time)
+        else:
+            data = interpolate(self.time, self._data, time)
+
+        sim = Simulation.from_array(time, data, self.species,
+                                    stochastic=self.stochastic,
+                                    stop_reason=self.stop_reason)
+        if self.sensitivities is not None:
+            shape = self.sensitivities.shape
+            sim.sensitivities = interpolate(
+                self.time, self.sensitivities.reshape(shape[0], -1),
+                time).reshape((len(time),) + shape[1:])
+            sim.parameters = self.parameters
+        return sim
 
     def plot(self, filename=None, title=None):
         """
@@ -50,14 +271,15 @@ class Simulation:
             title: Optional[str]
                 if present, the plot will have a title `title`.
         """
+        import matplotlib.pyplot as plt
+
         if filename:
             backend = plt.get_backend()
             plt.switch_backend("Svg")
 
-        for species, series in sorted(self.sim.items()):
-            series = self.sim[species]
+        for species in sorted(self.species):
             if species.name != "nothing":
-                plt.plot(self.time, series, label=f"[{species}]")
+                plt.plot(self.time, self[species], label=f"[{species}]")
 
         plt.xlabel("time (seconds)")
         if self.stochastic:
@@ -78,3 +300,20 @@ class Simulation:
             plt.switch_backend(backend)
 
 
+def interpolate(times, states, grid):
+    """
+    Linearly interpolates the rows of the (time x species) array `states`,
+    sampled at `times`, at the times in `grid`, holding the first and last
+    rows constant outside of `times`.
+    """
+    if len(times) < 2:
+        return np.repeat(states[:1], len(grid), axis=0).astype(float)
+
+    hi = np.clip(np.searchsorted(times, grid, side="right"), 1,
+                 len(times) - 1)
+    lo = hi - 1
+    span = times[hi] - times[lo]
+    weight = np.divide(grid - times[lo], span, out=np.zeros(len(grid)),
+                       where=span > 0)
+    weight = np.clip(weight, 0, 1)[:, None]
+    return states[lo] * (1 - weight) + states[hi] * weight
@@ -0,0 +1,354 @@
+import numpy as np
+
+from crn.recording import TrajectoryBuffer
+
+def direct_method(stoichiometry, counts, t, rng, out=None, stats=None):
+    """
+    Gillespie's direct method. Fires one reaction at a time, picked with
+    probability proportional to its propensity, until time `t` or until no
+    reaction can fire.
+
+    args:
+        stoichiometry: Stoichiometry
+            The compiled CRN to simulate.
+        counts: np.ndarray
+            The initial molecule count of every species.
+        t: Union[float, int]
+            The upper bound of the time to run the simulation to.
+        rng: np.random.Generator
+            The source of randomness.
+        out: Optional[Union[TrajectoryBuffer, TrajectoryWriter]]
+            Where to record the molecule counts after each event, starting
+            with the initial state. Defaults to a new `TrajectoryBuffer`.
+        stats: Optional[crn.instrument.Stats]
+            If given, every event is counted in it.
+
+    Returns `out`.
+    """
+    x = np.array(counts, dtype=np.int64)
+    if out is None:
+        out = TrajectoryBuffer(len(x))
+    out.append(0, x)
+
+    curr_time = direct_steps(stoichiometry, x, 0, t, float("inf"), rng, out,
+                             stats)
+    if curr_time != float("inf"):
+        out.append(t, x)
+
+    return out
+
+def direct_steps(stoichiometry, x, curr_time, t, steps, rng, out,
+                 stats=None):
+    """
+    Fires at most `steps` reactions with the direct method, starting at
+    `curr_time`, updating the counts `x` in place and appending every event
+    to `out`, and counting it in `stats` if given.
+
+    Returns the time of the last event, a time at or past `t` if the next
+    event would happen after `t`, or infinity if no reaction can fire.
+    """
+    changes = stoichiometry.changes
+    indptr, indices, data = changes.indptr, changes.indices, changes.data
+
+    step = 0
+    while step < steps:
+        props = np.cumsum(stoichiometry.propensities(x))
+        p_tot = props[-1] if len(props) else 0
+
+        if p_tot <= 0:
+            return float("inf")
+
+        wait = rng.exponential(1 / p_tot)
+        curr_time += wait
+        if curr_time >= t:
+            return curr_time
+
+        j = np.searchsorted(props, rng.random() * p_tot, side="right")
+        j = min(j, len(props) - 1)
+        lo, hi = indptr[j], indptr[j + 1]
+        x[indices[lo:hi]] += data[lo:hi]
+
+        out.append(curr_time, x, indices[lo:hi])
+        if stats is not None:
+            stats.fire(j, curr_time, wait)
+        step += 1
+
+    return curr_time
+
+def next_reaction_method(stoichiometry, counts, t, rng, out=None,
+                         stats=None):
+    """
+    Gibson and Bruck's next reaction method. Every reaction keeps an
+    absolute putative firing time in an indexed priority queue; after a
+    reaction fires only the reactions that depend on it, according to
+    `Stoichiometry.dependency_graph`, get new propensities and firing
+    times, so each event costs O(log R) for sparse networks rather than
+    O(R).
+
+    Takes the same arguments and returns the same values as
+    `direct_method`.
+    """
+    # `x` is read one element at a time, which is much faster on a list;
+    # `state` mirrors it so recording a state is a plain array copy
+    state = np.array(counts, dtype=np.int64)
+    x = state.tolist()
+    changes = stoichiometry.changes
+    indptr, columns = changes.indptr, changes.indices
+    indices, data = columns.tolist(), changes.data.tolist()
+    dependencies = stoichiometry.dependency_graph()
+    propensity = stoichiometry.propensity
+
+    if out is None:
+        out = TrajectoryBuffer(len(state))
+    out.append(0, state)
+
+    props = stoichiometry.propensities(np.array(counts)).tolist()
+    with np.errstate(divide="ignore"):
+        firing = (rng.exponential(size=len(props)) / props).tolist()
+    queue = IndexedPriorityQueue(firing)
+    last_time = 0.0
+
+    while props:
+        j, curr_time = queue.top()
+
+        if curr_time == float("inf"):
+            break
+
+        if curr_time >= t:
+            out.append(t, state)
+            break
+
+        for n in range(indptr[j], indptr[j + 1]):
+            x[indices[n]] += data[n]
+            state[indices[n]] = x[indices[n]]
+
+        out.append(curr_time, state, columns[indptr[j]:indptr[j + 1]])
+        if stats is not None:
+            stats.fire(j, curr_time, curr_time - last_time)
+            last_time = curr_time
+
+        for i in dependencies[j]:
+            old, new = props[i], propensity(i, x)
+            props[i] = new
+
+            if new <= 0:
+                queue.update(i, float("inf"))
+            elif i == j or old <= 0:
+                queue.update(i, curr_time + rng.exponential() / new)
+            else:
+                # reuse the remaining waiting time, rescaled to the new rate
+                remaining = queue[i] - curr_time
+                queue.update(i, curr_time + old / new * remaining)
+
+    return out
+
+
+def tau_leaping(stoichiometry, counts, t, rng, epsilon=0.03, critical=10,
+                ssa_steps=100, out=None, stats=None):
+    """
+    Approximate simulation by tau-leaping with the step size selection of
+    Cao, Gillespie and Petzold (2006). Every leap fires a Poisson
+    distributed number of each reaction, with the leap chosen so that no
+    propensity is expected to change by more than a fraction `epsilon`.
+
+    Reactions that are within `critical` firings of exhausting one of their
+    reactants fire at most once per leap, and a leap that would still make
+    a count negative is retried with half the step size. When a leap would
+    be shorter than a few exact steps, it falls back to `ssa_steps` steps of
+    the direct method instead.
+
+    Takes the same arguments and returns the same values as
+    `direct_method`, except that every recorded state is the end of a leap
+    rather than a single event. With `stats`, the leaps retried with half
+    the step size are counted as rejected, so `stats.rejected` is 0 rather
+    than None if no leap was.
+    """
+    x = np.array(counts, dtype=np.int64)
+    changes = stoichiometry.changes
+    consumed = changes.multiply(changes < 0).tocsr()
+    changes_t = changes.T.tocsr()
+    changes_sq_t = changes.power(2).T.tocsr()
+    g = _highest_order_terms(stoichiometry)
+    reactants = np.flatnonzero(g[0])
+
+    # rows of `consumed` that use up at least one species
+    consuming = np.flatnonzero(np.diff(consumed.indptr))
+    starts = consumed.indptr[:-1][consuming]
+
+    if out is None:
+        out = TrajectoryBuffer(len(x))
+    out.append(0, x)
+    if stats is not None and stats.rejected is None:
+        stats.rejected = 0
+
+    curr_time = 0
+    while curr_time < t:
+        props = stoichiometry.propensities(x)
+        p_tot = props.sum()
+
+        if p_tot <= 0:
+            curr_time = float("inf")
+            break
+
+        # firings left before some reactant runs out
+        left = np.full(len(props), np.inf)
+        if consuming.size:
+            ratio = x[consumed.indices] // -consumed.data
+            left[consuming] = np.minimum.reduceat(ratio, starts)
+        crit = (props > 0) & (left < critical)
+        noncrit = np.where(crit, 0, props)
+
+        tau1 = _leap_size(x, noncrit, changes_t, changes_sq_t, g, reactants,
+                          epsilon)
+
+        if tau1 < 10 / p_tot:
+            curr_time = direct_steps(stoichiometry, x, curr_time, t,
+                                     ssa_steps, rng, out, stats)
+            continue
+
+        p_crit = props[crit].sum()
+        while True:
+            tau2 = rng.exponential(1 / p_crit) if p_crit > 0 else np.inf
+            tau = min(tau1, tau2, t - curr_time)
+
+            fired = rng.poisson(noncrit * tau)
+            if tau2 <= tau1 and tau2 < t - curr_time:
+                crit_props = np.where(crit, props, 0).cumsum()
+                j = np.searchsorted(crit_props, rng.random() * p_crit,
+                                    side="right")
+                fired[min(j, len(props) - 1)] += 1
+
+            new_x = x + changes_t @ fired
+            if (new_x >= 0).all():
+                break
+            if stats is not None:
+                stats.reject(tau)
+            tau1 /= 2
+
+        x[:] = new_x
+        curr_time += tau
+        out.append(curr_time, x)
+        if stats is not None:
+            stats.leap(fired, curr_time, tau)
+        if curr_time == t:
+            return out
+
+    if curr_time != float("inf"):
+        out.append(t, x)
+
+    return out
+
+def _highest_order_terms(stoichiometry):
+    """
+    For every species, the highest order of the reactions it is a reactant
+    of and the largest coefficient it has in one of those reactions. Both
+    are 0 for species that are never a reactant. Used to compute the `g_i`
+    of Cao, Gillespie and Petzold.
+    """
+    exponents = stoichiometry.exponents
+    orders = np.asarray(exponents.sum(axis=1)).ravel()
+    order = np.zeros(exponents.shape[1], dtype=np.int64)
+    coeff = np.zeros(exponents.shape[1], dtype=np.int64)
+
+    for j in range(exponents.shape[0]):
+        lo, hi = exponents.indptr[j], exponents.indptr[j + 1]
+        for i, c in zip(exponents.indices[lo:hi], exponents.data[lo:hi]):
+            if orders[j] > order[i]:
+                order[i], coeff[i] = orders[j], c
+            elif orders[j] == order[i]:
+                coeff[i] = max(coeff[i], c)
+
+    return order, coeff
+
+def _leap_size(x, props, changes_t, changes_sq_t, g, reactants, epsilon):
+    """
+    The largest leap that keeps the expected relative change of every
+    propensity below `epsilon`, given the propensities `props` of the
+    non-critical reactions.
+    """
+    if not props.any() or not reactants.size:
+        return np.inf
+
+    mu = (changes_t @ props)[reactants]
+    sigma2 = (changes_sq_t @ props)[reactants]
+
+    order, coeff = g[0][reactants], g[1][reactants]
+    xr = x[reactants].astype(float)
+    x1 = 1 / np.maximum(xr - 1, 1)
+    x2 = 2 / np.maximum(xr - 2, 1)
+    gi = order.astype(float)
+    gi = np.where((order == 2) & (coeff == 2), 2 + x1, gi)
+    gi = np.where((order == 3) & (coeff == 2), 1.5 * (2 + x1), gi)
+    gi = np.where((order == 3) & (coeff == 3), 3 + x1 + x2, gi)
+
+    bound = np.maximum(epsilon * xr / gi, 1)
+    with np.errstate(divide="ignore"):
+        tau = np.minimum(bound / np.abs(mu), bound ** 2 / sigma2)
+
+    return tau.min()
+
+
+class IndexedPriorityQueue:
+    """
+    A binary min-heap of keys, one per index 0..n-1, that also tracks where
+    every index is in the heap so its key can be changed in O(log n).
+
+    args:
+        keys: List[float]
+            The initial key of every index.
+    """
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.heap = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.position = [0] * len(self.keys)
+        for p, i in enumerate(self.heap):
+            self.position[i] = p
+
+    def __getitem__(self, i):
+        return self.keys[i]
+
+    def top(self):
+        """
+        Returns the index with the smallest key, and that key.
+        """
+        i = self.heap[0]
+        return i, self.keys[i]
+
+    def update(self, i, key):
+        """
+        Changes the key of index `i` to `key`, restoring the heap order.
+        """
+        old = self.keys[i]
+        self.keys[i] = key
+        if key < old:
+            self._sift_up(self.position[i])
+        elif key > old:
+            self._sift_down(self.position[i])
+
+    def _swap(self, p, q):
+        heap, position = self.heap, self.position
+        heap[p], heap[q] = heap[q], heap[p]
+        position[heap[p]] = p
+        position[heap[q]] = q
+
+    def _sift_up(self, p):
+        heap, keys = self.heap, self.keys
+        while p > 0:
+            parent = (p - 1) >> 1
+            if keys[heap[p]] >= keys[heap[parent]]:
+                break
+            self._swap(p, parent)
+            p = parent
+
+    def _sift_down(self, p):
+        heap, keys, n = self.heap, self.keys, len(self.heap)
+        while True:
+            child = 2 * p + 1
+            if child >= n:
+                break
+            if child + 1 < n and keys[heap[child + 1]] < keys[heap[child]]:
+                child += 1
+            if keys[heap[child]] >= keys[heap[p]]:
+                break
+            self._swap(p, child)
+            p = child
@@ -0,0 +1,446 @@
+import copy
+import numpy as np
+
+from scipy import sparse
+
+class Stoichiometry:
+    """
+    Compiled, array based representation of a mass-action CRN. This is what
+    the simulators actually run on; it holds no sympy objects, so evaluating
+    the rate laws is a handful of vectorized NumPy operations.
+
+    This class probably won't be constructed by a user. `CRN` builds one
+    from its reactions with `Stoichiometry.from_reactions`.
+
+    args:
+        reactants: scipy.sparse.spmatrix
+            (reactions x species) matrix of reactant coefficients.
+        products: scipy.sparse.spmatrix
+            (reactions x species) matrix of product coefficients.
+        rates: Sequence[float]
+            The rate constant of every reaction.
+        inert: Sequence[int]
+            Indices of species that never appear in a rate law, such as
+            "nothing". They are still produced and consumed, but their
+            value is treated as 1 when computing fluxes.
+
+    attributes:
+        reactants: scipy.sparse.csr_matrix
+            (reactions x species) matrix of reactant coefficients.
+        products: scipy.sparse.csr_matrix
+            (reactions x species) matrix of product coefficients.
+        net: scipy.sparse.csr_matrix
+            (species x reactions) net stoichiometry matrix, products minus
+            reactants, laid out so that `net @ fluxes` is the rate of
+            change of every species.
+        exponents: scipy.sparse.csr_matrix
+            (reactions x species) matrix of the powers each species is
+            raised to in the rate law of each reaction.
+        changes: scipy.sparse.csr_matrix
+            (reactions x species) matrix of how many molecules of each
+            species a single firing of each reaction adds or removes,
+            leaving out the inert species.
+        rates: np.ndarray
+            The rate constant of every reaction, or, in a copy made by
+            `with_rates`, a (batch x reactions) array of them.
+    """
+
+    def __init__(self, reactants, products, rates, inert=()):
+        self.reactants = sparse.csr_matrix(reactants, dtype=np.int64)
+        self.products = sparse.csr_matrix(products, dtype=np.int64)
+        self.rates = np.array(rates, dtype=float)
+        self.inert = np.array(sorted(inert), dtype=np.intp)
+
+        if self.reactants.shape != self.products.shape:
+            raise ValueError(
+                "Stoichiometry: reactants and products must have the same "
+                f"shape, got {self.reactants.shape} and "
+                f"{self.products.shape}.")
+
+        if self.rates.shape != (self.reactants.shape[0],):
+            raise ValueError(
+                "Stoichiometry: expected one rate constant per reaction, "
+                f"got {self.rates.shape[0]} for "
+                f"{self.reactants.shape[0]} reactions.")
+
+        for m in (self.reactants, self.products):
+            m.sum_duplicates()
+            m.eliminate_zeros()
+
+        self.net = (self.products - self.reactants).T.tocsr()
+        self.net.eliminate_zeros()
+
+        self.exponents = self.reactants.copy()
+        self.exponents.data[np.isin(self.exponents.indices, self.inert)] = 0
+        self.exponents.eliminate_zeros()
+
+        self.changes = self.net.T.tocsr()
+        self.changes.data[np.isin(self.changes.indices, self.inert)] = 0
+        self.changes.eliminate_zeros()
+
+        # Flattened rate-law terms, one per nonzero exponent. Reactions
+        # without any term (e.g. 0 >> a) have a constant flux, so they are
+        # left out of the `reduceat` and keep their rate constant as is.
+        indptr = self.exponents.indptr
+        self._columns = self.exponents.indices
+        self._powers = self.exponents.data.astype(float)
+        self._active = np.flatnonzero(np.diff(indptr))
+        self._starts = indptr[:-1][self._active]
+        self._max_power = int(self._powers.max(initial=1))
+        # structures built on first use; they don't depend on the rate
+        # constants, so copies made by `with_rates` share them
+        self._cache = {}
+
+    @classmethod
+    def from_reactions(cls, species_index, reactions):
+        """
+        Compile `reactions` over the species ordering given by
+        `species_index`, a map of int to Species like
+        `CRN.species_index`.
+        """
+        column = {sp: i for i, sp in species_index.items()}
+        rows, cols, r_data, p_data = [], [], [], []
+
+        for j, rxn in enumerate(reactions):
+            for sp, c in rxn.reactants.species.items():
+                rows.append(j)
+                cols.append(column[sp])
+                r_data.append(c)
+                p_data.append(0)
+            for sp, c in rxn.products.species.items():
+                rows.append(j)
+                cols.append(column[sp])
+                r_data.append(0)
+                p_data.append(c)
+
+        shape = (len(reactions), len(species_index))
+        reactants = sparse.csr_matrix((r_data, (rows, cols)), shape=shape)
+        products = sparse.csr_matrix((p_data, (rows, cols)), shape=shape)
+        rates = [rxn.coeff for rxn in reactions]
+        inert = [i for i, sp in species_index.items() if sp.name == "nothing"]
+
+        return cls(reactants, products, rates, inert)
+
+    def with_rates(self, rates):
+        """
+        Returns a copy with the rate constants `rates`, sharing the matrices
+        and everything built from them with `self`, so nothing is compiled
+        again. `rates` can also be a (batch x reactions) array, giving every
+        row of a (batch x species) array of concentrations its own rate
+        constants in `fluxes`, `rhs` and `jacobian`.
+        """
+        rates = np.array(rates, dtype=float)
+        if rates.ndim not in (1, 2) or rates.shape[-1] != self.n_reactions:
+            raise ValueError(
+                "Stoichiometry.with_rates: expected one rate constant per "
+                f"reaction, got an array of shape {rates.shape} for "
+                f"{self.n_reactions} reactions.")
+
+        compiled = copy.copy(self)
+        compiled.rates = rates
+        return compiled
+
+    @property
+    def n_species(self):
+        return self.reactants.shape[1]
+
+    @property
+    def n_reactions(self):
+        return self.reactants.shape[0]
+
+    def fluxes(self, x):
+        """
+        Returns the mass-action flux of every reaction given the species
+        concentrations `x`, ordered like the columns of `reactants`. `x` can
+        also be a (batch x species) array, giving (batch x reactions) fluxes.
+        """
+        return self.rates * self.monomials(x)
+
+    def monomials(self, x):
+        """
+        Returns the flux of every reaction without its rate constant, the
+        product of its reactant concentrations, which is also the
+        derivative of the flux with respect to the rate constant. Takes `x`
+        like `fluxes`.
+        """
+        mono = np.ones(x.shape[:-1] + (self.n_reactions,))
+        if self._starts.size:
+            terms = np.power(x[..., self._columns], self._powers)
+            mono[..., self._active] = np.multiply.reduceat(
+                terms, self._starts, axis=-1)
+        return mono
+
+    def rhs(self, x, t=None):
+        """
+        Returns the rate of change of every species given the species
+        concentrations `x`, or of every row of a (batch x species) array.
+        The signature matches what `odeint` expects.
+        """
+        return (self.net @ self.fluxes(x).T).T
+
+    def propensities(self, counts):
+        """
+        Returns the stochastic propensity of every reaction given the
+        molecule counts `counts`: the rate constant times the number of
+        ordered ways to pick the reactants, like `Reaction.propensity`.
+        """
+        props = self.rates.copy()
+        if self._starts.size:
+            x = counts[self._columns].astype(float)
+            terms = x.copy()
+            # falling factorial x (x - 1) ... (x - c + 1), clamped so that
+            # it is +0 rather than -0 when x < c, which would otherwise
+            # turn into a waiting time of -inf in the next reaction method
+            for i in range(1, self._max_power):
+                terms *= np.where(self._powers > i, np.maximum(x - i, 0), 1)
+            props[self._active] *= np.multiply.reduceat(terms, self._starts)
+        return props
+
+    def propensity_terms(self):
+        """
+        Returns, for every reaction, its list of (species, coefficient)
+        reactant terms as plain Python ints. Used by the simulators that
+        update one propensity at a time with `propensity`. Built on first
+        use and cached.
+        """
+        if "propensity_terms" not in self._cache:
+            indptr = self.exponents.indptr
+            columns = self._columns.tolist()
+            powers = self.exponents.data.tolist()
+            self._cache["propensity_terms"] = [
+                list(zip(columns[lo:hi], powers[lo:hi]))
+                for lo, hi in zip(indptr[:-1], indptr[1:])]
+
+        return self._cache["propensity_terms"]
+
+    def propensity(self, j, counts):
+        """
+        Returns the propensity of reaction `j` alone given the molecule counts
+        `counts`, which can be any indexable sequence of ints.
+        """
+        prop = float(self.rates[j])
+        for i, c in self.propensity_terms()[j]:
+            x = counts[i]
+            for n in range(c):
+                prop *= x - n
+        return prop
+
+    def dependency_graph(self):
+        """
+        Returns the reaction dependency graph as a list: entry `j` holds the
+        reactions whose propensity can change when reaction `j` fires,
+        always including `j` itself. Built on first use and cached.
+        """
+        if "dependency_graph" not in self._cache:
+            changed = self.changes.astype(bool)
+            depends = (changed @ self.exponents.astype(bool).T).tocsr()
+            depends = (depends + sparse.identity(self.n_reactions,
+                                                 dtype=bool, format="csr"))
+            depends = depends.tocsr()
+            depends.sort_indices()
+            indptr, indices = depends.indptr, depends.indices.tolist()
+            self._cache["dependency_graph"] = [
+                indices[lo:hi] for lo, hi in zip(indptr[:-1], indptr[1:])]
+
+        return self._cache["dependency_graph"]
+
+    def reachable(self, present):
+        """
+        Returns boolean masks of the species that can ever be present and
+        of the reactions that can ever fire, starting with the species in
+        the boolean mask `present`. A reaction can fire once every one of
+        its reactants can be present, and then so can its products. The
+        inert species count as always present.
+        """
+        present = np.array(present, dtype=bool)
+        present[self.inert] = True
+        fired = np.zeros(self.n_reactions, dtype=bool)
+
+        consumers = self.exponents.tocsc()
+        c_indptr, c_indices = consumers.indptr.tolist(), \
+            consumers.indices.tolist()
+        p_indptr, p_indices = self.products.indptr.tolist(), \
+            self.products.indices.tolist()
+
+        # the number of reactants of every reaction that can't be present
+        # yet; a reaction fires when this reaches 0
+        missing = np.zeros(self.n_reactions, dtype=np.int64)
+        if self._starts.size:
+            missing[self._active] = np.add.reduceat(
+                (~present[self._columns]).astype(np.int64), self._starts)
+        missing = missing.tolist()
+        queue = [j for j, m in enumerate(missing) if m == 0]
+        mask = present.tolist()
+
+        while queue:
+            j = queue.pop()
+            for i in p_indices[p_indptr[j]:p_indptr[j + 1]]:
+                if mask[i]:
+                    continue
+                mask[i] = True
+                for r in c_indices[c_indptr[i]:c_indptr[i + 1]]:
+                    missing[r] -= 1
+                    if missing[r] == 0:
+                        queue.append(r)
+
+        present[:] = mask
+        fired[[j for j, m in enumerate(missing) if m == 0]] = True
+        return present, fired
+
+    def subnetwork(self, reactions, species=None):
+        """
+        Returns the network of only the reactions with indices `reactions`,
+        over only the species with indices `species` (default all of them,
+        in which case the columns stay the same). The species left out must
+        not take part in any of the reactions kept.
+        """
+        reactants, products = self.reactants[reactions], \
+            self.products[reactions]
+        inert = self.inert
+        if species is not None:
+            reactants, products = reactants[:, species], products[:, species]
+            inert = np.flatnonzero(np.isin(species, self.inert))
+
+        return Stoichiometry(reactants, products,
+                             self.rates[..., reactions], inert)
+
+    def prune(self, present, species=True):
+        """
+        Returns the subnetwork of the reactions that can ever fire starting
+        with the species in the boolean mask `present`, see `reachable`,
+        along with the indices of the reactions and of the species kept.
+        Every other species stays at its initial value, which is 0. With
+        `species` False, every species is kept, so the columns of the
+        subnetwork are the same as those of `self`.
+
+        The subnetworks are cached by `present`, and reused with other rate
+        constants, so pruning again from the same species costs little.
+        """
+        key = (np.asarray(present, dtype=bool).tobytes(), species)
+        pruned = self._cache.setdefault("pruned", {})
+        if key not in pruned:
+            present, fired = self.reachable(present)
+            reactions = np.flatnonzero(fired)
+            columns = (np.flatnonzero(present) if species
+                       else np.arange(self.n_species))
+            # keep the cache from growing without bound
+            if len(pruned) >= 16:
+                pruned.clear()
+            pruned[key] = (self.subnetwork(reactions, columns if species
+                                           else None), reactions, columns)
+
+        subnetwork, reactions, columns = pruned[key]
+        rates = self.rates[..., reactions]
+        if not np.array_equal(rates, subnetwork.rates):
+            subnetwork = subnetwork.with_rates(rates)
+        return subnetwork, reactions, columns
+
+    def conservation(self):
+        """
+        Returns the conservation laws of the network as the indices of a
+        set of independent species, whose concentrations determine all the
+        others, and the (species x independent) link matrix `link`, such
+        that at all times
+
+            x - x0 == link @ (x[independent] - x0[independent])
+
+        The rows of `link` for the independent species are the identity.
+        Each of the other rows is a conserved total: the species it belongs
+        to minus its combination of independent species never changes. The
+        independent species are picked by a rank revealing QR factorization
+        of the net stoichiometry. The inert species never change, so each
+        of them is dependent with a zero row in `link`. Built on first use
+        and cached.
+        """
+        if "conservation" not in self._cache:
+            # scipy.linalg takes a while to import and is rarely needed
+            import scipy.linalg
+
+            net = self.net.toarray()
+            net[self.inert] = 0
+            n = self.n_species
+            if net.size:
+                _, r, pivots = scipy.linalg.qr(net.T, mode="economic",
+                                               pivoting=True)
+                diag = np.abs(np.diag(r))
+                tol = max(net.shape) * np.finfo(float).eps * diag.max()
+                independent = np.sort(pivots[:np.sum(diag > tol)])
+            else:
+                independent = np.empty(0, dtype=np.intp)
+            dependent = np.setdiff1d(np.arange(n), independent)
+
+            # every dependent row of `net` is a combination of the
+            # independent ones, and so are the concentrations
+            link = np.zeros((n, len(independent)))
+            link[independent, np.arange(len(independent))] = 1
+            if len(dependent) and len(independent):
+                combination = np.linalg.lstsq(net[independent].T,
+                                              net[dependent].T, rcond=None)[0]
+                # the laws usually have small integer coefficients
+                rounded = np.round(combination)
+                close = np.abs(combination - rounded) < 1e-10
+                combination[close] = rounded[close]
+                link[dependent] = combination.T
+
+            self._cache["conservation"] = (independent,
+                                           sparse.csr_matrix(link))
+
+        return self._cache["conservation"]
+
+    def jacobian(self, x, t=None):
+        """
+        Returns the analytic (species x species) Jacobian of `rhs` at the
+        concentrations `x` as a CSR matrix. For a (batch x species) array
+        `x` this is the block diagonal Jacobian of the stacked system.
+        """
+        rows, pairs, others_of, starts = self._get_jacobian_terms()
+        batch = np.atleast_2d(x).shape[0]
+
+        x = np.atleast_2d(x)[:, self._columns]
+        terms = np.power(x, self._powers)
+        others = np.ones_like(terms)
+        if starts.size:
+            others[:, others_of] = np.multiply.reduceat(terms[:, pairs],
+                                                        starts, axis=1)
+
+        # d/dx_i of k * x_i^e * (other terms) = k * e * x_i^(e - 1) * ...
+        data = (self.rates[..., rows] * self._powers
+                * np.power(x, self._powers - 1) * others)
+
+        nnz, (n_rxns, n_species) = len(self._columns), self.exponents.shape
+        offsets = np.arange(batch)[:, None]
+        indptr = (self.exponents.indptr[:-1] + nnz * offsets).ravel()
+        dflux = sparse.csr_matrix(
+            (data.ravel(), (self._columns + n_species * offsets).ravel(),
+             np.append(indptr, nnz * batch)),
+            shape=(n_rxns * batch, n_species * batch))
+
+        net = self.net
+        if batch > 1:
+            net = sparse.kron(sparse.identity(batch), net, format="csr")
+
+        return (net @ dflux).tocsr()
+
+    def _get_jacobian_terms(self):
+        """
+        For every nonzero exponent, its reaction and the positions of the
+        other terms in the same rate law. Built on first use and cached.
+        """
+        if "jacobian_terms" not in self._cache:
+            indptr = self.exponents.indptr
+            rows = np.repeat(np.arange(self.n_reactions), np.diff(indptr))
+            pairs, others_of, starts = [], [], []
+            for j in self._active:
+                lo, hi = indptr[j], indptr[j + 1]
+                for p in range(lo, hi):
+                    if hi - lo > 1:
+                        others_of.append(p)
+                        starts.append(len(pairs))
+                        pairs.extend(q for q in range(lo, hi) if q != p)
+
+            self._cache["jacobian_terms"] = (
+                rows, np.array(pairs, dtype=np.intp),
+                np.array(others_of, dtype=np.intp),
+                np.array(starts, dtype=np.intp))
+
+        return self._cache["jacobian_terms"]
@@ -0,0 +1,471 @@
+import json
+import numpy as np
+import os
+
+from crn import Species
+from crn.utils import GrowableArray
+
+# bytes of changes a TrajectoryWriter buffers before writing them out
+BUFFER_SIZE = 1 << 23
+
+# the log of changes a TrajectoryWriter streams to, one row after another
+LOG_FILES = ("log.indptr.bin", "log.columns.bin", "log.values.bin")
+
+def dump_species(species):
+    """
+    Returns a JSON-serializable record of every species in `species`,
+    which `load_species` turns back into equal species.
+    """
+    return [{"name": sp.name, "is_schema": sp.is_schema,
+             "schema_groups": sp.schema_groups if sp.is_schema else None}
+            for sp in species]
+
+def load_species(records):
+    """
+    Returns the species recorded by `dump_species`.
+    """
+    return [Species(record["name"], record["is_schema"],
+                    record["schema_groups"])
+            for record in records]
+
+
+class TrajectoryWriter:
+    """
+    Writes a trajectory to disk as it is simulated, a chunk of changes at
+    a time, so a simulation never holds more than one chunk of it in
+    memory.
+
+    While simulating, only the initial state and, for every later row,
+    the entries that changed are appended to a log, like in
+    `TrajectoryBuffer`, through a few files kept open. `close` then
+    compacts the log into one column per species, so `Trajectory` can read
+    a species without going through the changes of the others:
+
+    - a species that changes in at least half the rows is stored densely,
+      its value at every row in "dense.bin", and reads back as a view of
+      the memory-mapped file;
+    - any other species is stored as the rows it changed at and its new
+      values, next to each other in "rows.bin" and "values.bin", and its
+      series is rebuilt from them in O(rows).
+
+    Either way a species takes at most as much space as its changes did in
+    the log, so the trajectory is never larger than the log was. The
+    compaction reads the log a chunk at a time, and needs about as much
+    free disk space again while it runs.
+
+    args:
+        path: str
+            The directory to write the trajectory to. It is created if it
+            does not exist, and a trajectory already in it is overwritten.
+        species: List[Species]
+            The species to record, in column order.
+        columns: Optional[Sequence[int]]
+            For every species in `species`, its index in the states passed
+            to `append`. Defaults to all of them, in order.
+        dtype: np.dtype
+            The type of the values of every series.
+        stochastic: bool
+            Whether the series are molecule counts rather than
+            concentrations.
+        chunksize: Optional[int]
+            The number of changes buffered between writes, and read at a
+            time by `close`. Defaults to about `BUFFER_SIZE` bytes worth of
+            changes.
+
+    attributes:
+        time: float
+            The time of the last row appended.
+        stop_reason: Optional[str]
+            Why the simulation stopped, written out by `close` unless it
+            is given another one.
+    """
+    def __init__(self, path, species, columns=None, dtype=np.int64,
+                 stochastic=True, chunksize=None):
+        self.path = path
+        self.species = list(species)
+        self.columns = (np.arange(len(self.species)) if columns is None
+                        else np.asarray(columns, dtype=np.intp))
+        self.dtype = np.dtype(dtype)
+        self.stochastic = stochastic
+        self.rows = 0
+        self.changes = 0
+        self.time = None
+        self.stop_reason = None
+
+        if chunksize is None:
+            chunksize = max(BUFFER_SIZE // (8 + self.dtype.itemsize), 1)
+        self.chunksize = chunksize
+        self._times = GrowableArray(float)
+        self._indptr = GrowableArray(np.int64)
+        self._columns = GrowableArray(np.int64)
+        self._values = GrowableArray(self.dtype)
+        self._last = None
+        # the column of every index of the states passed to `append`, or -1
+        self._position = None
+
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(os.path.join(path, name), "wb")
+                       for name in ("initial.bin", "time.bin") + LOG_FILES}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, time, state, changed=None):
+        """
+        Records the state `state` at time `time`. `changed`, if given, holds
+        the indices of every entry of `state` that may differ from the
+        previous state; otherwise they are found by comparing the two.
+        """
+        if self._last is None:
+            self._position = np.full(len(state), -1, dtype=np.intp)
+            self._position[self.columns] = np.arange(len(self.columns))
+            self._last = np.asarray(state)[self.columns].astype(self.dtype)
+            self._last.tofile(self._files["initial.bin"])
+            columns = np.empty(0, dtype=np.intp)
+        elif changed is None:
+            columns = np.flatnonzero(state[self.columns] != self._last)
+        else:
+            columns = self._position[changed]
+            columns = columns[columns >= 0]
+
+        values = state[self.columns[columns]]
+        self._last[columns] = values
+        self._record(time, columns, values)
+
+    def extend(self, times, counts, columns, values):
+        """
+        Records a row at every time in `times`, the i-th one setting the
+        next `counts[i]` entries of `columns` to the matching `values`.
+        Must come after the initial state was recorded with `append`.
+        """
+        columns = np.asarray(columns)
+        # the last change of every species is its new value
+        last = len(columns) - 1 - np.unique(columns[::-1],
+                                            return_index=True)[1]
+        self._last[columns[last]] = values[last]
+        self._times.extend(times)
+        self._indptr.extend(self.changes + len(self._columns)
+                            + np.cumsum(counts))
+        self._columns.extend(columns)
+        self._values.extend(values)
+        if len(times):
+            self.time = times[-1]
+        if len(self._columns) >= self.chunksize:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes out the buffered rows.
+        """
+        for name, array in (("time.bin", self._times),
+                            ("log.indptr.bin", self._indptr),
+                            ("log.columns.bin", self._columns),
+                            ("log.values.bin", self._values)):
+            array.values.tofile(self._files[name])
+        self.rows += len(self._times)
+        self.changes += len(self._columns)
+        for array in (self._times, self._indptr, self._columns,
+                      self._values):
+            array.size = 0
+
+    def close(self, stop_reason=None):
+        """
+        Writes out the buffered rows, compacts the log into columns and
+        writes the metadata. Returns the `Trajectory` written.
+        """
+        if stop_reason is not None:
+            self.stop_reason = stop_reason
+        self.flush()
+        for f in self._files.values():
+            f.close()
+
+        dense = self._compact()
+        for name in LOG_FILES:
+            os.remove(os.path.join(self.path, name))
+
+        meta = {
+            "rows": self.rows,
+            "dtype": self.dtype.str,
+            "stochastic": self.stochastic,
+            "stop_reason": self.stop_reason,
+            "species": dump_species(self.species),
+            "dense": dense.tolist(),
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return Trajectory(self.path)
+
+    def _record(self, time, columns, values):
+        self._times.append(time)
+        self._columns.extend(columns)
+        self._values.extend(values)
+        self._indptr.append(self.changes + len(self._columns))
+        self.time = time
+        if len(self._columns) >= self.chunksize:
+            self.flush()
+
+    def _compact(self):
+        """
+        Rewrites the log as the files of `Trajectory`, and returns the
+        columns of the species stored densely.
+        """
+        n, rows, changes = len(self.species), self.rows, self.changes
+        log = {name: _map(os.path.join(self.path, name), dtype, changes)
+               for name, dtype in (("log.columns.bin", np.int64),
+                                   ("log.values.bin", self.dtype))}
+        log_columns, log_values = log["log.columns.bin"], log["log.values.bin"]
+        indptr = _map(os.path.join(self.path, "log.indptr.bin"), np.int64,
+                      rows)
+
+        counts = np.zeros(n, dtype=np.int64)
+        for lo in range(0, changes, self.chunksize):
+            counts += np.bincount(log_columns[lo:lo + self.chunksize],
+                                  minlength=n)
+
+        # a dense column costs a value per row, a sparse one a row and a
+        # value per change
+        is_dense = (counts > 0) & (2 * counts >= rows)
+        dense = np.flatnonzero(is_dense)
+        slot = np.full(n, -1, dtype=np.int64)
+        slot[dense] = np.arange(len(dense))
+        sparse_counts = np.where(is_dense, 0, counts)
+        offsets = np.concatenate([[0], np.cumsum(sparse_counts)])
+        offsets.tofile(os.path.join(self.path, "offsets.bin"))
+
+        out_rows = _create(os.path.join(self.path, "rows.bin"), np.int64,
+                           offsets[-1])
+        out_values = _create(os.path.join(self.path, "values.bin"),
+                             self.dtype, offsets[-1])
+        out_dense = _create(os.path.join(self.path, "dense.bin"),
+                            self.dtype, len(dense) * rows)
+        if len(dense):
+            out_dense = out_dense.reshape(len(dense), rows)
+            last = np.fromfile(os.path.join(self.path, "initial.bin"),
+                               dtype=self.dtype)[dense]
+
+        # the changes are read a block of rows at a time; a block holds
+        # about `chunksize` changes and, densely, `chunksize` values
+        filled = offsets[:-1].copy()
+        block = max(1, self.chunksize // max(len(dense), 1))
+        r0 = 0
+        while r0 < rows:
+            lo = indptr[r0 - 1] if r0 else 0
+            r1 = np.searchsorted(indptr, lo + self.chunksize, side="right")
+            r1 = min(max(r1, r0 + 1), r0 + block, rows)
+            hi = indptr[r1 - 1]
+
+            columns = np.asarray(log_columns[lo:hi])
+            values = np.asarray(log_values[lo:hi])
+            change_rows = np.repeat(
+                np.arange(r0, r1),
+                np.diff(np.asarray(indptr[r0:r1]), prepend=lo))
+
+            # sparse species: append to their runs, in row order
+            kept = np.flatnonzero(~is_dense[columns])
+            order = kept[np.argsort(columns[kept], kind="stable")]
+            sorted_columns = columns[order]
+            starts = np.flatnonzero(np.diff(sorted_columns, prepend=-1))
+            rank = (np.arange(len(order))
+                    - np.repeat(starts, np.diff(np.append(starts,
+                                                          len(order)))))
+            position = filled[sorted_columns] + rank
+            out_rows[position] = change_rows[order]
+            out_values[position] = values[order]
+            np.add.at(filled, sorted_columns, 1)
+
+            # dense species: carry every value forward to the next change
+            if len(dense):
+                kept = np.flatnonzero(is_dense[columns])
+                latest = np.full((r1 - r0, len(dense)), -1, dtype=np.int64)
+                np.maximum.at(latest, (change_rows[kept] - r0,
+                                       slot[columns[kept]]), kept)
+                np.maximum.accumulate(latest, axis=0, out=latest)
+                part = np.where(latest >= 0, values[np.maximum(latest, 0)],
+                                last)
+                out_dense[:, r0:r1] = part.T
+                last = part[-1]
+
+            r0 = r1
+
+        for array in (out_rows, out_values, out_dense):
+            if isinstance(array, np.memmap):
+                array.flush()
+        return dense
+
+
+class Trajectory:
+    """
+    A trajectory written by `TrajectoryWriter`, read back lazily: the files
+    are memory-mapped and a species is only read when it is looked up.
+    Looking up a species stored densely returns a read-only view of its
+    column in "dense.bin", without copying it; any other species is built
+    from its own changes only.
+
+    args:
+        path: str
+            The directory the trajectory was written to.
+
+    attributes:
+        species: List[Species]
+            The species recorded, in column order.
+        stochastic: bool
+            Whether the series are molecule counts.
+        stop_reason: Optional[str]
+            Why the simulation stopped, if the simulator reported it.
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.rows = meta["rows"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.stochastic = meta["stochastic"]
+        self.stop_reason = meta["stop_reason"]
+        self.species = load_species(meta["species"])
+        self.column = {sp: i for i, sp in enumerate(self.species)}
+
+        n = len(self.species)
+        self._slot = dict(zip(meta["dense"], range(len(meta["dense"]))))
+        self._times = None
+        self._initial = _map(os.path.join(path, "initial.bin"), self.dtype,
+                             n if self.rows else 0)
+        self._offsets = np.fromfile(os.path.join(path, "offsets.bin"),
+                                    dtype=np.int64)
+        self._rows = _map(os.path.join(path, "rows.bin"), np.int64,
+                          self._offsets[-1])
+        self._values = _map(os.path.join(path, "values.bin"), self.dtype,
+                            self._offsets[-1])
+        self._dense = _map(os.path.join(path, "dense.bin"), self.dtype,
+                           len(self._slot) * self.rows
+                           ).reshape(len(self._slot), self.rows)
+
+    def __len__(self):
+        return len(self.species)
+
+    def __iter__(self):
+        return iter(self.species)
+
+    def __contains__(self, sp):
+        return sp in self.column
+
+    def __getitem__(self, sp):
+        return self._series(self.column[sp])
+
+    def items(self):
+        return ((sp, self[sp]) for sp in self.species)
+
+    @property
+    def times(self):
+        """
+        The time of every row.
+        """
+        if self._times is None:
+            self._times = _map(os.path.join(self.path, "time.bin"), float,
+                               self.rows)
+        return self._times
+
+    def changes(self, sp):
+        """
+        Returns the rows at which species `sp` changed and its value after
+        each change, as views of the memory-mapped files. Empty for a
+        species stored densely, whose series is a view already.
+        """
+        lo, hi = self._offsets[self.column[sp]:self.column[sp] + 2]
+        return self._rows[lo:hi], self._values[lo:hi]
+
+    def series(self, columns):
+        """
+        Returns the dense (time x columns) array of the values of the
+        species in the columns `columns`.
+        """
+        return np.column_stack(
+            [np.empty((self.rows, 0), dtype=self.dtype)]
+            + [self._series(column) for column in columns])
+
+    def resample(self, grid, columns=None):
+        """
+        Returns the (grid x columns) array of the values at the times in
+        `grid`, as `TrajectoryBuffer.resample` does.
+        """
+        rows = np.maximum(
+            np.searchsorted(self.times, grid, side="right") - 1, 0)
+        if columns is None:
+            columns = range(len(self.species))
+
+        result = np.empty((len(rows), len(columns)), dtype=self.dtype)
+        if self.rows == 0:
+            return result
+        for i, column in enumerate(columns):
+            if column in self._slot:
+                result[:, i] = self._dense[self._slot[column]][rows]
+                continue
+            lo, hi = self._offsets[column:column + 2]
+            if lo == hi:
+                result[:, i] = self._initial[column]
+                continue
+            changed = np.searchsorted(self._rows[lo:hi], rows,
+                                      side="right") - 1
+            result[:, i] = np.where(
+                changed >= 0, self._values[lo:hi][np.maximum(changed, 0)],
+                self._initial[column])
+        return result
+
+    def _series(self, column):
+        if column in self._slot:
+            return self._dense[self._slot[column]]
+        if self.rows == 0:
+            return np.empty(0, dtype=self.dtype)
+
+        lo, hi = self._offsets[column:column + 2]
+        if lo == hi:
+            # never changed: a read-only view of the initial value
+            return np.broadcast_to(self._initial[column], (self.rows,))
+        # the initial value up to the first change, then every new value
+        # up to the next one
+        runs = np.diff(np.concatenate([[0], self._rows[lo:hi],
+                                       [self.rows]]))
+        return np.repeat(np.concatenate([[self._initial[column]],
+                                         self._values[lo:hi]]), runs)
+
+
+def _map(name, dtype, size):
+    """
+    Memory-maps the first `size` entries of file `name` read-only.
+    """
+    # mmap can't map empty files
+    if size == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(name, dtype=dtype, mode="r", shape=(size,))
+
+def _create(name, dtype, size):
+    """
+    Creates the file `name` of `size` entries and memory-maps it.
+    """
+    if size == 0:
+        open(name, "wb").close()
+        return np.empty(0, dtype=dtype)
+    return np.memmap(name, dtype=dtype, mode="w+", shape=(size,))
+
+
+def lookup(keys, values, initial, n_rows, rows, columns):
+    """
+    Returns the (rows x columns) array of the values of a trajectory of
+    `n_rows` rows stored as changes: for every column, the value it was
+    last set to at or before every row, or its `initial` value. `keys`
+    holds `column * n_rows + row` for every change, in increasing order,
+    and `values` the value it set.
+    """
+    rows = np.asarray(rows)
+    if not len(keys):
+        # nothing ever changed
+        return np.broadcast_to(initial[columns],
+                               (len(rows), len(columns))).copy()
+
+    query = columns * n_rows + rows[:, None]
+    pos = np.maximum(np.searchsorted(keys, query, side="right") - 1, 0)
+    found = (keys[pos] <= query) & (keys[pos] >= columns * n_rows)
+    return np.where(found, values[pos], initial[columns])
@@ -1,11 +1,10 @@
-import matplotlib.pyplot as plt
+import gc
+import importlib.util
+import numpy as np
 import os
-import pkgutil
 import sys
 
 from contextlib import contextmanager
-from lib2to3.main import main as lib2to3_main
-from types import ModuleType
 from os.path import join, dirname
 
 @contextmanager
@@ -27,6 +26,8 @@ def no_output():
 
 @contextmanager
 def plot_without_xserver():
+    import matplotlib.pyplot as plt
+
     backend = plt.get_backend()
     plt.switch_backend("Svg")
 
@@ -35,6 +36,22 @@ def plot_without_xserver():
     plt.switch_backend(backend)
 
 
+@contextmanager
+def gc_paused():
+    """
+    Pauses the cyclic garbage collector, which otherwise rescans every
+    object made so far many times over while hundreds of thousands of
+    acyclic ones are built in a row.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 def datadir(filename=""):
     """
     Returns the absolute path of python-crn's data directory. Creates the
@@ -51,15 +68,79 @@ def datadir(filename=""):
 
 
 def stochpy_fix():
-    with no_output():
-        stochpy = pkgutil.get_loader("stochpy")
+    """
+    Makes the installed StochPy importable on Python 3 by running `lib2to3`
+    on the file of StochPy that still uses `dict.has_key`. `crn` itself does
+    not need StochPy, so this is only worth calling before importing StochPy
+    to run a file written by `CRN.write_pscfile`.
+
+    The file is only rewritten if it still needs it, so calling this again
+    is cheap. Returns False if StochPy is not installed.
+    """
+    spec = importlib.util.find_spec("stochpy")
+    if spec is None or spec.origin is None:
+        return False
 
-        if stochpy is None:
-            import stochpy
+    pysces_mini_model = join(dirname(spec.origin),
+        "modules", "PyscesMiniModel.py")
 
-        pysces_mini_model = join(dirname(stochpy.path),
-            "modules", "PyscesMiniModel.py")
+    with open(pysces_mini_model) as f:
+        if ".has_key(" not in f.read():
+            return True
 
+    from lib2to3.main import main as lib2to3_main
+
+    with no_output():
         lib2to3_main("lib2to3.fixes",
             f"-w -f has_key {pysces_mini_model}".split())
 
+    return True
+
+
+class GrowableArray:
+    """
+    An append-only NumPy array that doubles its capacity whenever it runs
+    out of room, so appending one row at a time is amortized O(1).
+
+    args:
+        dtype: np.dtype
+            The type of the elements.
+        shape: Tuple[int]
+            The shape of each row. Defaults to scalars.
+        capacity: int
+            The number of rows allocated up front.
+    """
+    def __init__(self, dtype=float, shape=(), capacity=1024):
+        self.data = np.empty((max(capacity, 1), *shape), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, n):
+        if n > len(self.data):
+            capacity = max(n, 2 * len(self.data))
+            data = np.empty((capacity, *self.data.shape[1:]),
+                            dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, row):
+        if self.size == len(self.data):
+            self._reserve(self.size + 1)
+        self.data[self.size] = row
+        self.size += 1
+
+    def extend(self, rows):
+        end = self.size + len(rows)
+        if end > len(self.data):
+            self._reserve(end)
+        self.data[self.size:end] = rows
+        self.size = end
+
+    @property
+    def values(self):
+        """
+        A view of the rows appended so far.
+        """
+        return self.data[:self.size]
@@ -6,7 +6,7 @@ here = path.abspath(path.dirname(__file__))
 
 # Get the long description from the README file
 long_description = open(path.join(here, 'README.md'), encoding='utf-8').read()
-requirements = ['scipy', 'numpy', 'stochpy', 'sympy']
+requirements = ['scipy', 'numpy', 'sympy']
 
 setup(
     name='crn',
@@ -19,6 +19,7 @@ setup(
     url='https://github.com/enricozb/python-crn',
     download_url='https://github.com/enricozb/python-crn/archive/0.1.0a0.tar.gz',
     install_requires=requirements,
+    extras_require={'stochpy': ['stochpy']},
     python_requires='>=3.6',
     keywords=['crn', 'simulator', 'simulation'],
     license='MIT',
@@ -0,0 +1,38 @@
+import numpy as np
+
+from crn import CRN, Species, species
+from crn.cache import CompileCache
+
+def test_hit_reuses_the_network_with_new_rates(tmp_path):
+    a, b, c = species("A B C")
+    cache = CompileCache(str(tmp_path))
+    first = CRN((a + b >> c).k(1), (c >> a).k(2), cache=cache)
+    assert len(cache.memory) == 1
+
+    # a new cache on the same directory reads the entry from disk
+    cache = CompileCache(str(tmp_path))
+    second = CRN((a + b >> c).k(3), (c >> a).k(4), cache=cache)
+    assert len(cache.memory) == 1
+    assert second.species_index == first.species_index
+    assert np.array_equal(second.stoichiometry.rates, [3, 4])
+
+    fresh = CRN((a + b >> c).k(3), (c >> a).k(4))
+    x = np.array([0.5, 1.0, 2.0])
+    assert np.allclose(second.stoichiometry.rhs(x),
+                       fresh.stoichiometry.rhs(x))
+
+def test_schema_species_do_not_collide(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    plain = Species("X<{n}>")
+    schema = Species("X<{n}>", True, {"n": "[0-9]+"})
+    other = Species("X<{n}>", True, {"n": "[01]"})
+    keys = {cache.key([plain >> 0]), cache.key([schema >> 0]),
+            cache.key([other >> 0])}
+    assert len(keys) == 3
+
+    y = species("Y")
+    CRN(plain + y >> 0, cache=cache)
+    crn = CRN(schema + y >> 0, cache=cache)
+    assert len(cache.memory) == 2
+    assert schema in crn.species_index.values()
+    assert plain not in crn.species_index.values()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+from crn.conservation import ReducedSystem
+
+def enzyme(inflow=True):
+    e, s, c, p, x = species("E S C P X")
+    reactions = [(e + s >> c).k(2), (c >> e + s).k(1), (c >> e + p).k(0.5),
+                 (2 * p >> s).k(0.3)]
+    if inflow:
+        reactions += [(0 >> x).k(0.1), (x >> 0).k(0.2)]
+    return CRN(*reactions), {e: 0.3, s: 2}
+
+def total(law, sim):
+    return sum(c * sim[sp] for sp, c in law.items())
+
+def test_conservation_laws_are_conserved():
+    e, c = species("E C")
+    crn, x0 = enzyme(inflow=False)
+    (law,) = crn.conservation_laws()
+    assert law == {e: 1, c: 1}
+    sim = crn.simulate(x0, t=10, rtol=1e-10, atol=1e-12)
+    assert np.allclose(total(law, sim), 0.3)
+
+def test_nothing_is_in_no_law():
+    crn, _ = enzyme()
+    (law,) = crn.conservation_laws()
+    assert set(law) == set(species("E C"))
+
+@pytest.mark.parametrize("inflow", [False, True])
+@pytest.mark.parametrize("method", ["LSODA", "BDF"])
+def test_reduced_system_matches_full(inflow, method):
+    crn, x0 = enzyme(inflow)
+    full = crn.simulate(x0, t=10, method=method, rtol=1e-8, atol=1e-10)
+    reduced = crn.simulate(x0, t=10, method=method, reduce=True, rtol=1e-8,
+                           atol=1e-10)
+    assert np.allclose(full.data, reduced.data, atol=1e-6)
+
+def test_reduced_system_reconstructs_every_species():
+    crn, x0 = enzyme()
+    v0 = crn.initial_vector(x0)
+    system = ReducedSystem(crn.stoichiometry, v0)
+    assert len(system.y0) < len(v0)
+    assert np.allclose(system.full(system.y0), v0)
+    # the rates of the integrated species are the full ones
+    assert np.allclose(system.rhs(system.y0),
+                       crn.stoichiometry.rhs(v0)[system.independent])
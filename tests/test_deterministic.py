@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+
+def enzyme():
+    e, s, c, p = species("E S C P")
+    crn = CRN((e + s >> c).k(2), (c >> e + s).k(1), (c >> e + p).k(0.5),
+              (2 * p >> s).k(0.3), (0 >> e).k(0.1))
+    return crn, {e: 0.3, s: 2}
+
+def test_simulate_batch_matches_simulate():
+    crn, x0 = enzyme()
+    rows = np.random.default_rng(0).uniform(0, 2, size=(5, len(crn.species)))
+    batch = crn.simulate_batch(rows, t=5, rtol=1e-8, atol=1e-10,
+                               chunksize=2)
+    assert batch.shape == (5, 100, len(crn.species))
+    for row, result in zip(rows, batch):
+        amounts = {sp: row[i] for i, sp in crn.species_index.items()}
+        sim = crn.simulate(amounts, t=5, method="BDF", rtol=1e-8, atol=1e-10)
+        expected = np.column_stack([sim[crn.species_index[i]]
+                                    for i in range(len(crn.species))])
+        assert np.allclose(result, expected, atol=1e-6)
+
+def test_simulate_batch_checks_its_shape():
+    crn, _ = enzyme()
+    with pytest.raises(ValueError):
+        crn.simulate_batch(np.zeros((2, len(crn.species) + 1)))
+
+def test_simulate_stops_at_steady_state():
+    a, b = species("A B")
+    decay = CRN((a >> b).k(1))
+    sim = decay.simulate({a: 1}, t=1000, steady_state=1e-6)
+    assert sim.stop_reason == "steady_state"
+    assert sim.stop_time < 20 and sim.time[-1] == sim.stop_time
+    assert sim[b][-1] == pytest.approx(1, abs=1e-5)
+
+def test_simulate_stops_when_until_holds():
+    a, b = species("A B")
+    decay = CRN((a >> b).k(1))
+    sim = decay.simulate({a: 1}, t=10, until=lambda conc: conc[b] > 0.5)
+    assert sim.stop_reason == "until"
+    # B passes 0.5 at log(2)
+    assert sim.stop_time == pytest.approx(np.log(2), abs=0.2)
+    assert sim[b][-1] > 0.5
+
+def test_simulate_times_out_and_runs_to_the_end():
+    a, b = species("A B")
+    decay = CRN((a >> b).k(1))
+    sim = decay.simulate({a: 1}, t=10)
+    assert sim.stop_reason == "time" and sim.stop_time == 10
+    sim = decay.simulate({a: 1}, t=10, timeout=0)
+    assert sim.stop_reason == "timeout" and sim.stop_time < 10
+
+def test_rate_grid_varies_the_last_reaction_fastest():
+    crn, _ = enzyme()
+    first = crn.reactions_index[0]
+    grid = crn.rate_grid({first: [1, 2, 3], 3: [5, 6]})
+    assert grid.shape == (6, len(crn.system))
+    assert np.array_equal(grid[:, 0], [1, 1, 2, 2, 3, 3])
+    assert np.array_equal(grid[:, 3], [5, 6, 5, 6, 5, 6])
+    untouched = [1, 2, 4]
+    assert np.array_equal(grid[:, untouched],
+                          np.tile(crn.stoichiometry.rates[untouched], (6, 1)))
+    with pytest.raises(ValueError):
+        crn.rate_grid({len(crn.system): [1]})
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep_matches_simulate(workers):
+    crn, x0 = enzyme()
+    first = crn.reactions_index[0]
+    sweep = crn.sweep(x0, {first: [1, 4], 2: [0.2, 2]}, t=5, rtol=1e-8,
+                      atol=1e-10, workers=workers, chunksize=3)
+    grid = crn.rate_grid({first: [1, 4], 2: [0.2, 2]})
+    assert sweep.shape == (4, 100, len(crn.species))
+    for rates, result in zip(grid, sweep):
+        sim = crn.simulate(x0, t=5, method="BDF", rates=rates, rtol=1e-8,
+                           atol=1e-10)
+        expected = np.column_stack([sim[crn.species_index[i]]
+                                    for i in range(len(crn.species))])
+        assert np.allclose(result, expected, atol=1e-6)
+
+def test_sweep_checks_its_shape():
+    crn, x0 = enzyme()
+    with pytest.raises(ValueError):
+        crn.sweep(x0, np.ones((2, len(crn.system) + 1)))
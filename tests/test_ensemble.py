@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+from crn.ensemble import Ensemble
+
+def samples(n, seed=0):
+    return np.random.default_rng(seed).poisson(5, size=(n, 4, 2))
+
+def test_statistics_match_numpy():
+    x, y = species("X Y")
+    ensemble = Ensemble([x, y], np.arange(4), reservoir=50, quantiles=[y])
+    data = samples(30)
+    for sample in data:
+        ensemble.add(sample)
+    assert np.allclose(ensemble.mean(x), data[:, :, 0].mean(axis=0))
+    assert np.allclose(ensemble.var("Y"), data[:, :, 1].var(axis=0, ddof=1))
+    assert np.array_equal(ensemble.min(x), data[:, :, 0].min(axis=0))
+    assert np.array_equal(ensemble.max(y), data[:, :, 1].max(axis=0))
+    # the reservoir holds everything while it isn't full
+    assert np.allclose(ensemble.quantile(y, 0.5),
+                       np.quantile(data[:, :, 1], 0.5, axis=0))
+    with pytest.raises(RuntimeError):
+        ensemble.quantile(x, 0.5)
+
+def test_merge_matches_adding_everything():
+    x, y = species("X Y")
+    data = samples(40)
+    whole = Ensemble([x, y], np.arange(4), reservoir=10, quantiles=[x])
+    halves = [Ensemble([x, y], np.arange(4), reservoir=10, quantiles=[x])
+              for _ in range(2)]
+    for i, sample in enumerate(data):
+        whole.add(sample)
+        halves[i % 2].add(sample)
+    halves[0].merge(halves[1])
+    assert halves[0].n == 40
+    for method in ("mean", "var", "min", "max"):
+        assert np.allclose(getattr(halves[0], method)(y),
+                           getattr(whole, method)(y))
+    assert len(halves[0]._reservoir) == 10
+
+def test_stoch_ensemble_is_seeded_and_unbiased():
+    a = species("A")
+    crn = CRN((0 >> a).k(10), (a >> 0).k(1))
+    options = dict(t=5, n=200, seed=3, chunksize=50, quantiles=[a])
+    one = crn.stoch_ensemble({a: 10}, workers=1, **options)
+    two = crn.stoch_ensemble({a: 10}, workers=2, **options)
+    assert np.array_equal(one.mean(a), two.mean(a))
+    assert np.array_equal(one.quantile(a, 0.9), two.quantile(a, 0.9))
+    # Poisson with mean 10 at steady state
+    assert abs(one.mean(a)[-1] - 10) < 4 * np.sqrt(10 / 200)
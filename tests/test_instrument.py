@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+
+def decay():
+    a, b = species("A B")
+    return (a, b), CRN((a >> b).k(1), (b >> a).k(0.5))
+
+@pytest.mark.parametrize("method", ("direct", "next_reaction"))
+def test_exact_methods_count_every_event(method):
+    (a, b), crn = decay()
+    sim = crn.stoch_simulate({a: 50}, t=5, seed=0, method=method,
+                             stats=True)
+    stats = sim.stats
+    # the last row only closes the trajectory at t
+    assert stats.steps == len(sim.time) - 2
+    assert stats.firings.sum() == stats.steps
+    assert np.array_equal(stats.firings,
+                          [np.sum(np.diff(sim[b]) == 1),
+                           np.sum(np.diff(sim[b]) == -1)])
+    assert stats.step_sizes.sum() == pytest.approx(sim.time[-2])
+    assert stats.rejected is None
+
+def test_tau_leaping_counts_leaps_and_rejections():
+    (a, b), crn = decay()
+    sim = crn.stoch_simulate({a: 10000}, t=2, seed=0, method="tau_leaping",
+                             stats=True)
+    stats = sim.stats
+    assert stats.rejected == len(stats.rejected_step_sizes) == 0
+    assert stats.firings[0] - stats.firings[1] == sim[b][-1]
+    assert stats.steps == len(stats.step_sizes) > 0
+    assert stats.time == pytest.approx(2)
+
+def test_deterministic_stats_and_callback():
+    (a, b), crn = decay()
+    calls = []
+    sim = crn.simulate({a: 1}, t=5, method="BDF", callback=calls.append)
+    stats = sim.stats
+    assert calls and calls[-1] is stats
+    assert stats.steps > 0 and stats.rhs_evaluations >= stats.steps
+    assert stats.rejected is None and stats.firings is None
+    assert set(stats.timings) == {"compile", "simulate", "record"}
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+from crn.parse import parse_reactions
+
+TEXT = """
+A + 2B -> C @ 2.5   # dimerization
+C -> 0 @ 0.1
+
+0 -> A
+2 * C -> B + A @ 0.5
+"""
+
+def terms(crn):
+    return [(rxn.reactants.species, rxn.products.species, rxn.coeff)
+            for rxn in crn.system]
+
+def test_from_text_matches_the_operators():
+    a, b, c = species("A B C")
+    built = CRN((a + 2 * b >> c).k(2.5), (c >> 0).k(0.1), (0 >> a).k(1),
+                (2 * c >> b + a).k(0.5))
+    parsed = CRN.from_text(TEXT)
+    assert terms(parsed) == terms(built)
+
+    amounts = {a: 1, b: 2, c: 0.5}
+    ours = parsed.simulate(amounts, t=5, rtol=1e-8, atol=1e-10)
+    theirs = built.simulate(amounts, t=5, rtol=1e-8, atol=1e-10)
+    for sp in (a, b, c):
+        assert np.allclose(ours[sp], theirs[sp], atol=1e-6)
+
+def test_from_arrays_fills_empty_sides_with_nothing():
+    reactants = np.array([[1, 1], [0, 0], [0, 1]])
+    products = np.array([[0, 2], [1, 0], [0, 0]])
+    crn = CRN.from_arrays(["X", "Y"], reactants, products, [1, 2, 3])
+    names = [sp.name for sp in crn.species_index.values()]
+    assert names == ["X", "Y", "nothing"]
+    assert terms(crn) == terms(CRN.from_text(
+        "X + Y -> 2Y @ 1\n0 -> X @ 2\nY -> 0 @ 3"))
+    assert np.array_equal(crn.stoichiometry.rates, [1, 2, 3])
+
+def test_from_arrays_checks_the_species():
+    with pytest.raises(ValueError):
+        CRN.from_arrays(["X"], np.ones((1, 2)), np.ones((1, 2)))
+
+def test_parse_reactions():
+    names, reactants, products, rates = parse_reactions(TEXT)
+    assert names == ["A", "B", "C"]
+    assert rates == [2.5, 0.1, 1.0, 0.5]
+    assert sorted(zip(*reactants)) == [(0, 0, 1), (0, 1, 2), (1, 2, 1),
+                                       (3, 2, 2)]
+    assert sorted(zip(*products)) == [(0, 2, 1), (2, 0, 1), (3, 0, 1),
+                                      (3, 1, 1)]
+
+@pytest.mark.parametrize("line", ["A + B", "A -> B @ fast", "2 -> A"])
+def test_parse_reactions_rejects(line):
+    with pytest.raises(ValueError, match="line 2"):
+        parse_reactions("A -> B\n" + line)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from crn import CRN, schemas, species
+from crn.schema import SchemaIndex, SumTree
+
+def stacks():
+    # the network of crn/examples/schema_example.py
+    s1, s2, s3, halt = species("s1 s2 s3 halt")
+    Stack1, Stack2 = schemas("Stack1<{rest}{top}> Stack2<{rest}{top}>",
+                             {"rest": "[01]*", "top": "[01]"})
+    crn = CRN(
+        s1 + Stack1() >> halt + Stack1(),
+        s1 + Stack1("r1", 1) >> s2 + Stack1("r1"),
+        s1 + Stack1("r1", 0) >> s3 + Stack1("r1"),
+        s2 + Stack2("r2") >> s1 + Stack2("r2", 1),
+        s3 + Stack2("r2") >> s1 + Stack2("r2", 0))
+    initial = {s1: 1, Stack1(101010): 1, Stack2(): 1}
+    return crn, initial, [s1, s2, s3, halt], (Stack1, Stack2)
+
+def test_index_matches_possible_reactions():
+    crn, _, states, (Stack1, Stack2) = stacks()
+    pool = states + [stack(bits) for stack in (Stack1, Stack2)
+                     for bits in ("", 0, 1, 10, 101, 1101)]
+    index = SchemaIndex(crn.system)
+    present = set()
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        sp = pool[rng.integers(len(pool))]
+        if sp in present:
+            present.discard(sp)
+            index.remove(sp)
+        else:
+            present.add(sp)
+            index.add(sp)
+        # what matching every tuple of present species from scratch finds
+        expected = {str(rxn) for schema in crn.system if schema.is_schema
+                    for rxn in schema.possible_reactions(present)}
+        assert {str(rxn) for rxn in index} == expected
+
+def test_sum_tree_finds_the_cumulative_slot():
+    rng = np.random.default_rng(1)
+    weights = np.zeros(100)
+    tree = SumTree(capacity=4)
+    for _ in range(500):
+        i = int(rng.integers(100))
+        weights[i] = rng.choice([0.0, rng.uniform()])
+        tree[i] = weights[i]
+        assert np.isclose(tree.total, weights.sum())
+        assert tree.positive == np.count_nonzero(weights)
+        if tree.positive:
+            u = rng.uniform() * weights.sum()
+            expected = np.searchsorted(np.cumsum(weights), u, side="right")
+            assert tree.find(u) == expected
+
+def test_event_log_replays_the_simulation():
+    crn, initial, _, _ = stacks()
+    sim = crn.schema_simulate(dict(initial), seed=0)
+    state = dict(initial)
+    assert len(sim.reactions) == len(sim.time) - 1 > 0
+    for row, rxn in enumerate(sim.reactions, 1):
+        for sp, c in rxn.reactants.species.items():
+            assert state.get(sp, 0) >= c
+            state[sp] -= c
+        for sp, c in rxn.products.species.items():
+            state[sp] = state.get(sp, 0) + c
+        for sp in sim:
+            assert sim[sp][row] == state.get(sp, 0)
+    # the stack ends up empty and the machine halted
+    assert state[species("halt")] == 1
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+
+OPTIONS = dict(t=5, method="BDF", rtol=1e-10, atol=1e-12)
+
+def enzyme():
+    e, s, c, p = species("E S C P")
+    crn = CRN((e + s >> c).k(2), (c >> e + s).k(1), (c >> e + p).k(0.5),
+              (2 * p >> s).k(0.3), (0 >> e).k(0.1))
+    return crn, {e: 0.3, s: 2}
+
+def finite_difference(crn, x0, j):
+    rates = crn.stoichiometry.rates
+    h = 1e-5 * rates[j]
+    up, down = rates.copy(), rates.copy()
+    up[j] += h
+    down[j] -= h
+    return (crn.simulate(x0, rates=up, **OPTIONS).data
+            - crn.simulate(x0, rates=down, **OPTIONS).data) / (2 * h)
+
+def test_sensitivities_match_finite_differences():
+    crn, x0 = enzyme()
+    sim = crn.simulate(x0, sensitivities=True, **OPTIONS)
+    assert sim.sensitivities.shape == sim.data.shape + (len(crn.system),)
+    for j in range(len(crn.system)):
+        assert np.allclose(sim.sensitivities[:, :, j],
+                           finite_difference(crn, x0, j), atol=1e-5)
+
+def test_sensitivities_to_some_reactions():
+    crn, x0 = enzyme()
+    chosen = [crn.reactions_index[2], 0]
+    sim = crn.simulate(x0, sensitivities=chosen, **OPTIONS)
+    assert sim.parameters == [crn.reactions_index[2], crn.reactions_index[0]]
+    p = species("P")
+    column = sim.column[p]
+    for i, j in enumerate((2, 0)):
+        assert np.allclose(sim.sensitivity(p)[:, i],
+                           finite_difference(crn, x0, j)[:, column],
+                           atol=1e-5)
+    assert np.array_equal(sim.sensitivity("P"), sim.sensitivity(p))
+
+def test_sensitivities_are_opt_in():
+    crn, x0 = enzyme()
+    sim = crn.simulate(x0, t=1)
+    assert sim.sensitivities is None
+    with pytest.raises(RuntimeError):
+        sim.sensitivity("P")
+    with pytest.raises(ValueError):
+        crn.simulate(x0, t=1, sensitivities=True, reduce=True)
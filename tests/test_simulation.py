@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from crn import CRN, Simulation, schemas, species
+from crn.recording import TrajectoryBuffer
+
+def test_buffer_keeps_only_changes_and_resamples():
+    buffer = TrajectoryBuffer(3)
+    states = np.array([[5, 0, 1], [4, 1, 1], [4, 1, 1], [3, 2, 1]])
+    for time, state in zip([0, 1, 2, 3], states):
+        buffer.append(time, state.copy())
+    assert len(buffer._columns) == 4
+    assert np.array_equal(buffer.states, states)
+    grid = [-1, 0, 0.5, 1, 2.5, 3, 10]
+    assert np.array_equal(buffer.resample(grid),
+                          states[[0, 0, 0, 1, 2, 3, 3]])
+    assert np.array_equal(buffer.resample(grid, [1]),
+                          states[[0, 0, 0, 1, 2, 3, 3]][:, [1]])
+
+def test_buffer_without_changes():
+    buffer = TrajectoryBuffer(2)
+    buffer.append(0, np.array([1, 2]))
+    buffer.append(1, np.array([1, 2]))
+    assert np.array_equal(buffer.resample([0.5, 5]), [[1, 2], [1, 2]])
+
+def test_stochastic_resample_is_piecewise_constant():
+    a, b = species("A B")
+    crn = CRN((a >> b).k(1))
+    sim = crn.stoch_simulate({a: 50}, t=5, seed=0)
+    grid = np.linspace(0, 5, 11)
+    resampled = sim.resample(grid)
+    rows = np.searchsorted(sim.time, grid, side="right") - 1
+    assert np.array_equal(resampled.data, sim.data[rows])
+    assert np.array_equal(resampled.time, grid)
+
+def test_deterministic_resample_interpolates():
+    x = species("X")
+    sim = Simulation({"time": np.array([0.0, 1.0, 2.0]),
+                      x: np.array([0.0, 2.0, 6.0])})
+    assert np.allclose(sim.resample([0.5, 1.5, 3])[x], [1, 4, 6])
+
+def stack():
+    s1, s2 = species("s1 s2")
+    Stack = schemas("Stack<{rest}{top}>", {"rest": "[01]*", "top": "[01]"})
+    crn = CRN(s1 + Stack("r", 1) >> s2 + Stack("r"),
+              s2 + Stack("r", 0) >> s1 + Stack("r"))
+    return crn, {s2: 1, Stack(1010): 1}, Stack
+
+def test_schema_species_are_looked_up_by_name():
+    crn, initial, Stack = stack()
+    sim = crn.schema_simulate(initial, steps=10, seed=0)
+    assert "Stack<1010>" in sim and Stack(1010) in sim
+    assert "Stack<9>" not in sim
+    assert np.array_equal(sim["Stack<1010>"], sim[Stack(1010)])
+    assert np.array_equal(sim[["s1", "Stack<1>"]],
+                          np.column_stack([sim["s1"], sim["Stack<1>"]]))
+    with pytest.raises(KeyError):
+        sim["Stack<9>"]
+
+def test_save_and_load_keep_the_species(tmp_path):
+    crn, initial, Stack = stack()
+    sim = crn.schema_simulate(initial, steps=10, seed=0)
+    sim.save(tmp_path / "sim.npz")
+    loaded = Simulation.load(tmp_path / "sim.npz")
+    assert loaded.species == sim.species
+    assert [sp.is_schema for sp in loaded.species] \
+        == [sp.is_schema for sp in sim.species]
+    assert loaded.stochastic and loaded.stop_reason == sim.stop_reason
+    assert np.array_equal(loaded.time, sim.time)
+    assert np.array_equal(loaded["Stack<1010>"], sim[Stack(1010)])
+
+def test_load_reads_plain_names(tmp_path):
+    x = species("X")
+    np.savez(tmp_path / "old.npz", time=[0, 1], data=[[1], [2]],
+             species=np.array(["X"]), stochastic=False, stop_reason="")
+    loaded = Simulation.load(tmp_path / "old.npz")
+    assert loaded.species == [x] and loaded.stop_reason is None
+    assert np.array_equal(loaded[x], [1, 2])
@@ -0,0 +1,37 @@
+import gc
+import pickle
+import pytest
+
+from crn import Species, schemas, species
+
+def test_species_are_interned():
+    a = Species("Interned")
+    assert Species("Interned") is a
+    assert species("Interned") is a
+    assert hash(Species("Interned")) == hash(a)
+
+def test_interned_species_are_freed():
+    sp = Species("Released")
+    del sp
+    gc.collect()
+    assert "Released" not in Species._interned
+
+def test_species_are_immutable():
+    a = Species("Frozen")
+    for attr in ("name", "is_schema", "schema_groups"):
+        with pytest.raises(AttributeError):
+            setattr(a, attr, None)
+
+def test_pickling_keeps_identity_and_schemas():
+    a = Species("Pickled")
+    assert pickle.loads(pickle.dumps(a)) is a
+
+    Stack = schemas("Stack<{rest}{top}>", {"rest": "[01]*", "top": "[01]"})
+    schema = Stack("r", 1)
+    schema.reactify()
+    copy = pickle.loads(pickle.dumps(schema))
+    assert copy == schema and hash(copy) == hash(schema)
+    assert copy.is_schema and copy.schema_groups == schema.schema_groups
+    assert copy.match(Species("Stack<101>")) is not None
+    assert copy.match(Species("Stack<>")) is None
+    assert copy != Species(schema.name)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from crn import CRN, species
+from crn.stochastic import IndexedPriorityQueue
+
+def final_counts(crn, amounts, sp, t, method, n=300):
+    return np.array([crn.stoch_simulate(amounts, t=t, seed=seed,
+                                        method=method)[sp][-1]
+                     for seed in range(n)])
+
+def test_next_reaction_moments():
+    # the count of A is Poisson with mean and variance 10 at steady state
+    a = species("A")
+    crn = CRN((0 >> a).k(10), (a >> 0).k(1))
+    counts = final_counts(crn, {a: 10}, a, 5, "next_reaction")
+    # four standard errors
+    assert abs(counts.mean() - 10) < 4 * np.sqrt(10 / len(counts))
+    assert abs(counts.var() - 10) < 3
+
+def test_next_reaction_agrees_with_direct():
+    f, d = species("F D")
+    crn = CRN((2 * f >> d).k(0.01), (d >> 2 * f).k(0.1))
+    direct = final_counts(crn, {f: 100}, d, 2, "direct")
+    next_reaction = final_counts(crn, {f: 100}, d, 2, "next_reaction")
+    error = np.sqrt((direct.var() + next_reaction.var()) / len(direct))
+    assert abs(direct.mean() - next_reaction.mean()) < 4 * error
+
+def test_tau_leaping_moments():
+    a = species("A")
+    crn = CRN((0 >> a).k(10), (a >> 0).k(1))
+    counts = final_counts(crn, {a: 10}, a, 5, "tau_leaping")
+    assert abs(counts.mean() - 10) < 4 * np.sqrt(10 / len(counts))
+    assert abs(counts.var() - 10) < 3
+
+def test_tau_leaping_agrees_with_direct_and_stays_nonnegative():
+    f, d = species("F D")
+    crn = CRN((2 * f >> d).k(0.01), (d >> 2 * f).k(0.1))
+    direct = final_counts(crn, {f: 1000}, d, 2, "direct", n=100)
+    leaps = final_counts(crn, {f: 1000}, d, 2, "tau_leaping", n=100)
+    error = np.sqrt((direct.var() + leaps.var()) / len(direct))
+    assert abs(direct.mean() - leaps.mean()) < 4 * error
+
+    sim = crn.stoch_simulate({f: 1000}, t=2, seed=0, method="tau_leaping")
+    assert sim[f].min() >= 0 and sim[d].min() >= 0
+    assert np.all(sim[f] + 2 * sim[d] == 1000)
+
+@pytest.mark.parametrize("method", ("direct", "next_reaction",
+                                    "tau_leaping"))
+def test_dimer_without_monomers(method):
+    # 2F -> A can never fire with F = 0
+    f, a, b = species("F A B")
+    crn = CRN((2 * f >> a).k(1), (b >> f).k(0.5))
+    counts = crn.initial_vector({b: 1}, dtype=np.int64)
+    assert not np.signbit(crn.stoichiometry.propensities(counts)).any()
+    sim = crn.stoch_simulate({b: 1}, t=10, seed=0, method=method)
+    assert np.all(np.isfinite(sim.time))
+    assert np.all(np.diff(sim.time) >= 0)
+    assert sim[a][-1] == 0
+    assert sim[f][-1] + sim[b][-1] == 1
+
+def test_indexed_priority_queue():
+    rng = np.random.default_rng(0)
+    keys = rng.uniform(size=50).tolist()
+    queue = IndexedPriorityQueue(keys)
+    for _ in range(500):
+        i = int(rng.integers(50))
+        key = float(rng.choice([rng.uniform(), np.inf]))
+        queue.update(i, key)
+        keys[i] = key
+        top, smallest = queue.top()
+        assert smallest == min(keys) and keys[top] == smallest
+        assert queue[i] == key
+    # every index is where the heap says it is
+    assert all(queue.heap[queue.position[i]] == i for i in range(50))
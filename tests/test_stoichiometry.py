@@ -0,0 +1,94 @@
+import numpy as np
+
+from crn import CRN, species
+
+def enzyme():
+    e, s, c, p = species("E S C P")
+    return CRN((e + s >> c).k(2), (c >> e + s).k(1), (c >> e + p).k(0.5),
+               (2 * p >> s).k(0.3), (0 >> e).k(0.1))
+
+def test_rhs_is_mass_action():
+    crn = enzyme()
+    column = {sp.name: i for i, sp in crn.species_index.items()}
+    x = np.random.default_rng(2).uniform(0.1, 2, size=len(crn.species))
+    e, s, c, p = (x[column[name]] for name in "ESCP")
+    fluxes = [2 * e * s, c, 0.5 * c, 0.3 * p ** 2, 0.1]
+    expected = {"E": -fluxes[0] + fluxes[1] + fluxes[2] + fluxes[4],
+                "S": -fluxes[0] + fluxes[1] + fluxes[3],
+                "C": fluxes[0] - fluxes[1] - fluxes[2],
+                "P": fluxes[2] - 2 * fluxes[3]}
+    rhs = crn.stoichiometry.rhs(x)
+    for name, value in expected.items():
+        assert np.isclose(rhs[column[name]], value)
+
+def test_jacobian_matches_finite_differences():
+    stoichiometry = enzyme().stoichiometry
+    n = stoichiometry.net.shape[0]
+    x = np.random.default_rng(0).uniform(0.1, 2, size=n)
+    h = 1e-6
+    numeric = np.column_stack([
+        (stoichiometry.rhs(x + h * e) - stoichiometry.rhs(x - h * e)) / (2 * h)
+        for e in np.eye(n)])
+    assert np.allclose(stoichiometry.jacobian(x).toarray(), numeric,
+                       atol=1e-6)
+
+def test_batched_jacobian_is_block_diagonal():
+    stoichiometry = enzyme().stoichiometry
+    n = stoichiometry.net.shape[0]
+    x = np.random.default_rng(1).uniform(0.1, 2, size=(3, n))
+    jacobian = stoichiometry.jacobian(x).toarray()
+    for b in range(3):
+        block = jacobian[b * n:(b + 1) * n, b * n:(b + 1) * n]
+        assert np.allclose(block, stoichiometry.jacobian(x[b]).toarray())
+        jacobian[b * n:(b + 1) * n, b * n:(b + 1) * n] = 0
+    assert not jacobian.any()
+
+def two_modules():
+    # only the first line can fire starting from A alone
+    a, b, c, x, y, z = species("A B C X Y Z")
+    return CRN((a >> b).k(1), (b >> a + c).k(0.5), (0 >> a).k(0.2),
+               (x + y >> z).k(1), (z >> x).k(1), (b + x >> y).k(2))
+
+def test_reachable_species_and_reactions():
+    crn = two_modules()
+    column = {sp.name: i for i, sp in crn.species_index.items()}
+    present = crn.initial_vector({species("A"): 1}) > 0
+    species_mask, reactions_mask = crn.stoichiometry.reachable(present)
+    reachable = {name for name, i in column.items() if species_mask[i]}
+    assert reachable == {"A", "B", "C", "nothing"}
+    assert reactions_mask.tolist() == [True, True, True, False, False, False]
+
+    subnetwork, reactions, columns = crn.stoichiometry.prune(present)
+    assert reactions.tolist() == [0, 1, 2]
+    assert sorted(columns.tolist()) == sorted(
+        column[name] for name in reachable)
+    assert subnetwork.net.shape == (len(columns), 3)
+
+def test_pruned_simulations_match():
+    crn = two_modules()
+    a = species("A")
+    x0 = {a: 1.5}
+    full = crn.simulate(x0, t=5, rtol=1e-9, atol=1e-12)
+    pruned = crn.simulate(x0, t=5, rtol=1e-9, atol=1e-12, prune=True)
+    assert np.allclose(full.data, pruned.data, atol=1e-8)
+    for name in "XYZ":
+        assert np.all(pruned[name] == 0)
+
+    for method in ("direct", "next_reaction", "tau_leaping"):
+        full = crn.stoch_simulate({a: 20}, t=5, seed=1, method=method)
+        pruned = crn.stoch_simulate({a: 20}, t=5, seed=1, method=method,
+                                    prune=True)
+        for name in "XYZ":
+            assert np.all(pruned[name] == 0)
+        if method == "direct":
+            assert np.array_equal(full.time, pruned.time)
+            assert np.array_equal(full.data, pruned.data)
+
+def test_pruned_ensemble_matches():
+    crn = two_modules()
+    a, c = species("A C")
+    full = crn.stoch_ensemble({a: 20}, t=5, n=20, seed=0, workers=1)
+    pruned = crn.stoch_ensemble({a: 20}, t=5, n=20, seed=0, workers=1,
+                                prune=True)
+    assert np.array_equal(full.mean(c), pruned.mean(c))
+    assert np.all(pruned.max("X") == 0)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from crn import CRN, Simulation, schemas, species
+from crn.storage import TrajectoryWriter, Trajectory
+
+METHODS = ("direct", "next_reaction", "tau_leaping")
+
+def network():
+    a, b, c = species("A B C")
+    return (a, b, c), CRN((a + b >> c).k(0.01), (c >> a + b).k(1),
+                          (0 >> a).k(5), (a >> 0).k(0.1))
+
+@pytest.mark.parametrize("method", METHODS)
+def test_path_round_trip(tmp_path, method):
+    (a, b, c), crn = network()
+    memory = crn.stoch_simulate({a: 100, b: 100}, t=20, seed=3,
+                                method=method)
+    disk = crn.stoch_simulate({a: 100, b: 100}, t=20, seed=3,
+                              method=method, path=str(tmp_path))
+    assert np.array_equal(memory.time, disk.time)
+    assert np.array_equal(memory.data, disk.data)
+    assert memory.stop_reason == disk.stop_reason == "time"
+
+    opened = Simulation.open(str(tmp_path))
+    assert opened.species == disk.species
+    assert opened.stop_reason == "time"
+    grid = np.linspace(0, 20, 7)
+    assert np.array_equal(opened.resample(grid).data,
+                          memory.resample(grid).data)
+
+def test_stop_reason_when_nothing_can_fire(tmp_path):
+    a, b = species("A B")
+    crn = CRN(a >> b)
+    sim = crn.stoch_simulate({a: 5}, t=1e6, seed=0, path=str(tmp_path))
+    assert sim.stop_reason == "steady_state"
+    assert Simulation.open(str(tmp_path))[b][-1] == 5
+
+def test_schema_species_survive_the_round_trip(tmp_path):
+    s1, s2, s3, halt = species("s1 s2 s3 halt")
+    Stack1, Stack2 = schemas("Stack1<{rest}{top}> Stack2<{rest}{top}>",
+                             {"rest": "[01]*", "top": "[01]"})
+    crn = CRN(
+        s1 + Stack1() >> halt + Stack1(),
+        s1 + Stack1("r1", 1) >> s2 + Stack1("r1"),
+        s1 + Stack1("r1", 0) >> s3 + Stack1("r1"),
+        s2 + Stack2("r2") >> s1 + Stack2("r2", 1),
+        s3 + Stack2("r2") >> s1 + Stack2("r2", 0))
+    initial = {s1: 1, Stack1(101010): 1, Stack2(): 1}
+    memory = crn.schema_simulate(dict(initial), seed=1)
+    crn.schema_simulate(dict(initial), seed=1, path=str(tmp_path))
+    disk = Simulation.open(str(tmp_path))
+    assert disk.species == memory.species
+    assert disk.stop_reason == memory.stop_reason == "steady_state"
+    for sp in memory:
+        assert np.array_equal(disk[sp], memory[sp])
+    assert disk[Stack1(101010)][0] == 1
+
+def test_columns_are_dense_or_sparse(tmp_path):
+    x, y, z = species("X Y Z")
+    rng = np.random.default_rng(0)
+    states = np.zeros((1000, 3), dtype=np.int64)
+    # X changes in every row, Y in a few and Z never
+    states[:, 0] = np.arange(1000)
+    states[:, 1] = np.cumsum(rng.uniform(size=1000) < 0.05)
+    states[:, 2] = 7
+    times = np.sort(rng.uniform(0, 10, size=1000))
+    with TrajectoryWriter(str(tmp_path), [x, y, z], chunksize=64) as out:
+        for time, state in zip(times, states):
+            out.append(time, state)
+
+    trajectory = Trajectory(str(tmp_path))
+    assert isinstance(trajectory[x], np.memmap)
+    rows, values = trajectory.changes(y)
+    assert isinstance(rows, np.memmap) and len(rows) < 100
+    assert np.array_equal(values, states[rows, 1])
+    assert np.array_equal(trajectory.series([0, 1, 2]), states)
+    grid = np.linspace(-1, 11, 50)
+    expected = states[np.maximum(
+        np.searchsorted(times, grid, side="right") - 1, 0)]
+    assert np.array_equal(trajectory.resample(grid), expected)
@@ -0,0 +1,47 @@
+import pytest
+
+from crn import CRN, species
+
+def network():
+    # Y ends up with all of X
+    x, y = species("X Y")
+    return x, y, CRN(x >> y)
+
+def test_validate_succeeds():
+    x, y, crn = network()
+    result = crn.validate(lambda conc: conc[x], input_species=[x],
+                          output_species=y, N=5, t=50)
+    assert result["success"] and result["samples"] == 5
+
+def test_validate_stops_at_the_first_counterexample():
+    x, y, crn = network()
+    calls = []
+
+    def double(conc):
+        calls.append(conc)
+        return 2 * conc[x]
+
+    result = crn.validate(double, input_species=[x], output_species=y,
+                          N=20, t=50)
+    assert not result["success"]
+    assert result["samples"] == 1 and len(calls) == 1
+    assert result["theoretical"] == pytest.approx(2 * result[x])
+
+@pytest.mark.parametrize("vectorized", (False, True))
+def test_validate_in_parallel(vectorized):
+    x, y, crn = network()
+    options = dict(input_species=[x], output_species=y, N=8, t=50,
+                   workers=2, chunksize=2, vectorized=vectorized)
+    assert crn.validate(lambda conc: conc[x], **options)["success"]
+    result = crn.validate(lambda conc: 2 * conc[x], **options)
+    assert not result["success"] and result["samples"] <= 8
+
+def test_validate_output_species():
+    x, y, crn = network()
+    z = species("Z")
+    options = dict(func=lambda conc: conc[x], input_species=[x], N=3, t=50)
+    assert crn.validate(output_species="Y", **options)["success"]
+    with pytest.raises(ValueError):
+        crn.validate(output_species=z, **options)
+    with pytest.raises(ValueError):
+        crn.validate(output_species="Z", **options)